@@ -1,9 +1,10 @@
-import KSAT
 import argparse
 
 import numpy as np
 
-from KSAT_functions import solve
+from InstanceCache import InstanceCache
+from ResultsStore import ResultsStore
+from Sweep import solving_probability, find_threshold
 
 """"
 Use this file to compute the empirical probability of solving a random instance
@@ -11,16 +12,38 @@ of the K-SAT problem, for every combination of the provided values for N and M.
 
 It uses a parser to extract the values for N and M from the command line.
 
-Example usage: python 3SAT_properties.py --N start, stop, step --M start, stop, step
+Example usage: python 3SAT_properties.py --N start, stop, step --M start, stop, step [--workers W] [--store FILE] [--experiment NAME]
+               python 3SAT_properties.py --N start, stop, step --threshold WIDTH [...]
 
 Here "start, stop, step" is a shortcut to extract an array of equally spaced values from start
 to stop both included, with equal spacing equal to step.
 If one wishes to keep N fixed and try different values for M, just run the program 
 with: --N start, start, 1
+
+With --workers W the instances are solved on a pool of W processes. Every instance is
+generated and annealed with its own random streams derived from the seed below, so the
+results do not depend on the number of workers.
+
+With --cache DIR the generated instances are stored in (and later loaded from) DIR, so that
+repeated sweeps over the same grid with different annealing parameters do not generate them again.
+
+Every run is recorded in the results store (results.db by default) under the experiment label
+given with --experiment, as soon as it completes: if the sweep is interrupted, running the same
+command again only runs the missing instances. The analysis scripts read the solving
+probabilities from the store.
+
+With --tolerance TOL, each (N, M) stops as soon as its solving probability is known to +-TOL
+(95% Wilson interval), instead of always running n_instances instances.
+
+With --threshold WIDTH, instead of sweeping a grid of M, the algorithmic threshold M/N at which the
+solving probability crosses 0.5 is estimated adaptively for every N (see Sweep.find_threshold),
+until its credible interval is narrower than WIDTH; --M is then not needed. Its runs, a few instances
+at scattered M, are recorded under the experiment label followed by "-threshold", so that the
+analysis scripts never take them for points of a grid.
 """
 
 
-# seed
+# seed (root of the random streams of all the instances)
 seed = 42
 
 # simAnn parameters
@@ -30,10 +53,16 @@ beta0 = 0.1
 beta1 = 10
 logspace = False
 early_stopping = True
+schedule = "fixed"          # "adaptive": betas and steps per beta chosen online, anneal_steps is then
+schedule_options = {}       # the maximum number of annealing steps (see SimAnn.simann_adaptive)
 
 # experiment parameters
 K = 3
 n_instances = 30
+alpha_range = (3.0, 5.0)    # range of M/N searched by --threshold
+max_instances = 1000        # instance budget of each threshold estimate
+batch = False           # if set to True, the n_instances of each (N, M) are annealed together in one vectorized run (fixed schedule only)
+cache_max_bytes = 10 * 2**30    # size cap of the instance cache (used with --cache)
 
 
 def parse_arguments():
@@ -48,47 +77,87 @@ def parse_arguments():
     parser.add_argument(
         "--M",
         type=str,
-        required=True,
-        help="elements of M in the form (start, stop, step)"
+        default=None,
+        help="elements of M in the form (start, stop, step) (not needed with --threshold)"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=None,
+        help="stop each (N, M) once P is known to +-tolerance (default: run all the instances)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="estimate the threshold M/N adaptively, to a credible interval of this width"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes (default: 1)"
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="directory of the instance cache (default: no cache)"
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default="results.db",
+        help="results store file (default: results.db)"
+    )
+    parser.add_argument(
+        "--experiment",
+        type=str,
+        default="data",
+        help="label of the experiment in the results store (default: data)"
     )
     
     args = parser.parse_args()
+    if args.M is None and args.threshold is None:
+        parser.error("--M is required unless --threshold is given")
 
     try:
         N_start, N_stop, N_step = [int(x) for x in args.N.split(",")]
-        M_start, M_stop, M_step = [int(x) for x in args.M.split(",")]
+        M_start, M_stop, M_step = [int(x) for x in args.M.split(",")] if args.M is not None else (0, 0, 1)
     except ValueError:
         raise ValueError("Input must be in the format 'start,stop,step' for both --N and --M.")
     
     N = [int(x) for x in np.arange(N_start, N_stop + N_step, N_step)]
     M = [int(x) for x in np.arange(M_start, M_stop + M_step, M_step)]
     
-    return N, M
-
-
-N, M = parse_arguments()
-
-
-
-def solving_probability(N:list, M:list, K:int, n_instances:int):
-    P = dict()
-    for n in N:
-        for m in M:
-            solved = 0
-            for _ in range(n_instances):
-                ksat = KSAT.KSAT(n, m, K, seed=None)
-                print(f"\nsolving {K}-SAT with {n} variables and {m} clauses:\n")
-                best, _ = solve(ksat, mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping)
-                if best.cost() == 0:
-                    solved += 1
-            P[(n, m)] = solved / n_instances
-    
-    return P
-
-
-P = solving_probability(N, M, K, n_instances)
-
-print("\n")
-for (n, m) in P:
-    print(f"Empirical probability of solving {K}-SAT with {n} variables and {m} clauses: {P[(n,m)]}\n")
-
+    return N, M, args.workers, args.cache, args.store, args.experiment, args.tolerance, args.threshold
+
+
+if __name__ == "__main__":
+    N, M, workers, cache_dir, store_path, experiment, tolerance, width = parse_arguments()
+    cache = InstanceCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
+    store = ResultsStore(store_path)
+
+    params = dict(anneal_steps=anneal_steps, mcmc_steps=mcmc_steps, beta0=beta0, beta1=beta1,
+                  logspace=logspace, early_stopping=early_stopping)
+    if schedule != "fixed":
+        params.update(schedule=schedule, schedule_options=schedule_options)
+
+    if width is not None:
+        for n in N:
+            alpha, (lo, hi), results = find_threshold(n, K, params, alpha_range, width, round_size=max(workers, 10),
+                                                      max_instances=max_instances, seed=seed, workers=workers,
+                                                      batch=batch, cache=cache, store=store,
+                                                      experiment=f"{experiment}-threshold")
+            print(f"Algorithmic threshold of {K}-SAT with {n} variables: M/N = {alpha} "
+                  f"[{lo}, {hi}] ({sum(runs for _, runs in results.values())} instances)\n")
+        store.close()
+    else:
+        P, used = solving_probability(N, M, K, n_instances, params, seed=seed, workers=workers, batch=batch, cache=cache,
+                                      store=store, experiment=experiment, tolerance=tolerance)
+        store.close()
+
+        print("\n")
+        for (n, m) in P:
+            print(f"Empirical probability of solving {K}-SAT with {n} variables and {m} clauses: {P[(n,m)]} ({used[(n,m)]} instances)\n")
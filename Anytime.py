@@ -0,0 +1,115 @@
+import time
+
+import numpy as np
+
+from SimAnn import simann
+
+## Anytime annealing: "the best assignment within 200 ms" or "within 10^7 flips".
+## anytime() restarts simann from fresh random configurations, with schedules of lengths given by
+## a restart policy, until the budget is exhausted or a solution is found, and returns the best
+## configuration found by any restart. The budget is shared by all the restarts and is checked
+## inside simann between chunks of proposals, so the run stops within budget.check_every
+## proposals of the deadline (or exactly at the flip budget), even in the middle of a restart.
+
+## Budget of a run: a wall-clock limit (seconds from now) and/or a number of proposed flips.
+## The clock is only read when the budget is charged, after each chunk of at most check_every
+## proposals (see SimAnn.run_moves).
+class Budget:
+    def __init__(self, seconds = None, flips = None, check_every = 1024):
+        if seconds is None and flips is None:
+            raise Exception("the budget needs a number of seconds and/or of flips")
+        self.start = time.monotonic()
+        self.deadline = self.start + seconds if seconds is not None else None
+        self.max_flips = flips
+        self.check_every = check_every
+        self.flips = 0
+        self.expired = False
+
+    ## Number of proposals that can run before the next check
+    def allowance(self):
+        if self.max_flips is None:
+            return self.check_every
+        return min(self.check_every, self.max_flips - self.flips)
+
+    ## Record n proposals; returns True once the budget is exhausted
+    def spend(self, n):
+        self.flips += n
+        return self.exhausted()
+
+    def exhausted(self):
+        if self.max_flips is not None and self.flips >= self.max_flips:
+            return True
+        if self.deadline is not None and not self.expired:
+            self.expired = time.monotonic() >= self.deadline
+        return self.expired
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+
+## Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ... (i = 1, 2, ...)
+def luby(i):
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    if (1 << k) - 1 == i:
+        return 1 << (k - 1)
+    return luby(i - (1 << (k - 1)) + 1)
+
+## Length (in annealing steps) of restart r = 0, 1, ... under a restart policy:
+##    "fixed"        base
+##    "geometric"    base * factor^r
+##    "luby"         base * luby(r + 1)
+## and at least one annealing step (a geometric policy with factor < 1 shrinks down to 1).
+def restart_length(policy, r, base, factor = 2.0):
+    if policy == "fixed":
+        return base
+    if policy == "geometric":
+        return max(1, int(round(base * factor ** r)))
+    if policy == "luby":
+        return base * luby(r + 1)
+    raise Exception(f"unknown restart policy {policy!r}, use 'fixed', 'geometric' or 'luby'")
+
+## Anneal probl with restarts until the budget (seconds and/or flips) is exhausted or a solution
+## is found. Restart r runs simann with anneal_steps = restart_length(restarts, r, base, factor)
+## and the other keyword arguments in params (mcmc_steps, beta0, beta1, backend, ...), seeded
+## with its own stream derived from `seed`.
+## Returns the best configuration found (a copy of probl) and the statistics of the run: best
+## cost, restart that found it, proposals, wall time, why it stopped ("solved", "flips" or
+## "deadline") and, for every restart, its length, proposals, best cost and wall time.
+def anytime(probl, seconds = None, flips = None, restarts = "luby", base = 10, factor = 2.0,
+            seed = None, check_every = 1024, **params):
+    if not (isinstance(base, (int, np.integer)) and base >= 1):
+        raise Exception("base must be an int greater or equal than 1")
+    if not factor > 0:
+        raise Exception("factor must be positive")
+    budget = Budget(seconds, flips, check_every)
+    entropy = np.random.SeedSequence(seed).entropy
+    best, best_c, best_restart = None, np.inf, None
+    stats = []
+    r = 0
+    while not budget.exhausted():
+        anneal_steps = restart_length(restarts, r, base, factor)
+        run_seed = np.random.SeedSequence(entropy, spawn_key=(r,))
+        flips_before, start = budget.flips, time.monotonic()
+        result, _ = simann(probl, anneal_steps=anneal_steps, seed=run_seed, budget=budget, **params)
+        c = result.cost()
+        stats.append(dict(restart=r, anneal_steps=anneal_steps, flips=budget.flips - flips_before,
+                          best_cost=c, seconds=time.monotonic() - start))
+        if c < best_c:
+            best, best_c, best_restart = result, c, r
+        if c == 0:
+            break
+        r += 1
+
+    if best_c == 0:
+        reason = "solved"
+    elif budget.max_flips is not None and budget.flips >= budget.max_flips:
+        reason = "flips"
+    else:
+        reason = "deadline"
+    if best is None:
+        best = probl.copy()
+        best_c = best.cost()
+    return best, dict(best_cost=best_c, best_restart=best_restart, restarts=len(stats), flips=budget.flips,
+                      seconds=budget.elapsed(), stopped=reason, runs=stats)
@@ -0,0 +1,225 @@
+import numpy as np
+
+from SimAnn import beta_schedule
+
+## Batched simulated annealing for K-SAT.
+## Instead of one configuration annealed one flip at a time, R configurations are kept
+## as the rows of an (R, N) array and each annealing step proposes one flip per row.
+## Deltas and Metropolis decisions for all the rows are evaluated with a handful of
+## vectorized NumPy operations, so the interpreter overhead is paid once per step
+## instead of once per replica.
+##
+## Every row r anneals its own instance inst[r], described by:
+##    index, s        (B, M, K) variables and signs of the clauses of each instance
+##    clause_mask     (B, M) False for the padding clauses of the shorter instances
+##    occ_tab         (B, N, D) clauses in which each variable shows up, padded with M
+##    sign_tab        (B, N, D) signs of those occurrences, padded with 0
+## Random initial configurations, one per row, and their clause counts and costs.
+## nsat has an extra last column, the dummy clause of the padding occurrences: its count is
+## never 0 or +-1, so padding never contributes to the deltas, and it is left untouched by
+## updates (sign 0). Padding clauses of shorter instances get the same value so they never
+## count as unsatisfied.
+def init_state(index, s, clause_mask, inst, N, rng):
+    B, M, K = index.shape
+    R = len(inst)
+    rows = np.arange(R)
+    X = rng.choice([-1,1], size=(R,N))
+    nsat = np.full((R, M + 1), -K - 1)
+    nsat[:, :M] = np.where(clause_mask[inst],
+                           np.count_nonzero(X[rows[:,None,None], index[inst]] * s[inst] == 1, axis=2),
+                           -K - 1)
+    c = np.count_nonzero(nsat == 0, axis=1)
+    return X, nsat, c
+
+## `mcmc_steps` Metropolis steps on every row, at inverse temperature beta (a number, or one
+## beta per row). X, nsat, c, best_x and best_c are updated in place (best_x/best_c keep the
+## best cost seen by each row and its configuration). Returns the accepted moves of each row.
+def mcmc(X, nsat, c, occ_tab, sign_tab, inst, beta, mcmc_steps, rng, best_x, best_c):
+    R, N = X.shape
+    rows = np.arange(R)
+    beta = np.broadcast_to(beta, (R,))
+    accepted = np.zeros(R, dtype=int)
+    for t in range(mcmc_steps):
+        moves = rng.integers(N, size=R)
+        uniforms = rng.random(R)
+
+        # delta cost of every proposal: breaks minus makes (see KSAT.compute_delta_cost)
+        occ = occ_tab[inst, moves]
+        lit = sign_tab[inst, moves] * X[rows, moves][:,None]
+        counts = nsat[rows[:,None], occ]
+        delta_c = np.count_nonzero(counts == lit, axis=1) - np.count_nonzero(counts == 0, axis=1)
+
+        ## Metropolis rule
+        acc = (delta_c <= 0)
+        up = ~acc
+        acc[up] = uniforms[up] < np.exp(-beta[up] * delta_c[up])
+
+        # Accept the moves of the accepted rows
+        r = rows[acc]
+        nsat[r[:,None], occ[acc]] = counts[acc] - lit[acc]
+        X[r, moves[acc]] *= -1
+        c[r] += delta_c[acc]
+        accepted += acc
+
+        better = (c < best_c)
+        if better.any():
+            best_c[better] = c[better]
+            best_x[better] = X[better]
+    return accepted
+
+## Rows anneal in lockstep through the same beta schedule. With early stopping, the run
+## ends after the first annealing step at which every instance has at least one solved row.
+def anneal(index, s, clause_mask, occ_tab, sign_tab, inst,
+           beta_list, mcmc_steps, rng, early_stopping=True):
+    B = index.shape[0]
+    R = len(inst)
+    X, nsat, c = init_state(index, s, clause_mask, inst, occ_tab.shape[1], rng)
+
+    ## Keep the best cost seen so far by each row, and its associated configuration.
+    best_x = X.copy()
+    best_c = c.copy()
+
+    acc_rates = [[] for _ in range(R)]
+
+    # Main loop of the annealing: Loop over the betas
+    for beta in beta_list:
+        if early_stopping and np.all(np.bincount(inst[best_c == 0], minlength=B) > 0):
+            break
+        accepted = mcmc(X, nsat, c, occ_tab, sign_tab, inst, beta, mcmc_steps, rng, best_x, best_c)
+        for r in range(R):
+            acc_rates[r].append((beta, int(accepted[r]) / mcmc_steps))
+
+    return best_x, best_c, acc_rates
+
+
+## Anneal `n_replicas` independent configurations of the same KSAT instance at once.
+## Returns the best configuration of each replica as an (R, N) array, the best costs and,
+## for every replica, the list of (beta, acceptance rate) pairs in the same format as simann.
+## With early stopping, the run ends as soon as one of the replicas has found a solution.
+def simann_replicas(probl, n_replicas = 16,
+                    anneal_steps = 10, mcmc_steps = 100,
+                    beta0 = 0.1, beta1 = 10.0,
+                    seed = None, logspace = False, early_stopping = True):
+    rng = np.random.default_rng(seed)
+    beta_list = beta_schedule(anneal_steps, beta0, beta1, logspace)
+
+    index, s, clause_mask, occ_tab, sign_tab = pack([probl])
+    inst = np.zeros(n_replicas, dtype=int)
+
+    return anneal(index, s, clause_mask, occ_tab, sign_tab, inst,
+                  beta_list, mcmc_steps, rng, early_stopping)
+
+
+## Pack a list of KSAT instances with the same N and K into padded tensors:
+## (B, M_max, K) index and signs, a (B, M_max) clause mask, and (B, N, D_max) occurrence tables.
+def pack(problems):
+    N, K = problems[0].N, problems[0].K
+    if any(p.N != N or p.K != K for p in problems):
+        raise Exception("all the instances in a batch must have the same N and K")
+    if K is None:
+        raise Exception("batched annealing needs clauses of the same length")
+    B = len(problems)
+    M = max(p.M for p in problems)
+    tables = [p.occurrence_table() for p in problems]
+    D = max(occ_tab.shape[1] for occ_tab, _ in tables)
+
+    index = np.zeros((B, M, K), dtype=int)
+    s = np.ones((B, M, K), dtype=int)
+    clause_mask = np.zeros((B, M), dtype=bool)
+    occ_tab = np.full((B, N, D), M, dtype=int)
+    sign_tab = np.zeros((B, N, D), dtype=int)
+    for b, (p, (occ, sign)) in enumerate(zip(problems, tables)):
+        index[b, :p.M] = p.index
+        s[b, :p.M] = p.s
+        clause_mask[b, :p.M] = True
+        # the dummy clause of each instance is moved to the common padding column M
+        occ_tab[b, :, :occ.shape[1]] = np.where(sign != 0, occ, M)
+        sign_tab[b, :, :sign.shape[1]] = sign
+    return index, s, clause_mask, occ_tab, sign_tab
+
+
+## Anneal many different instances (same N and K, any M) in lockstep, with `n_replicas`
+## configurations per instance. Returns, for every instance, whether it was solved, its best
+## cost, its best configuration (as a (B, N) array), and the (beta, acceptance rate) pairs of
+## its best replica. With early stopping, the run ends once every instance is solved.
+def simann_batch(problems, n_replicas = 1,
+                 anneal_steps = 10, mcmc_steps = 100,
+                 beta0 = 0.1, beta1 = 10.0,
+                 seed = None, logspace = False, early_stopping = True):
+    rng = np.random.default_rng(seed)
+    beta_list = beta_schedule(anneal_steps, beta0, beta1, logspace)
+
+    index, s, clause_mask, occ_tab, sign_tab = pack(problems)
+    inst = np.repeat(np.arange(len(problems)), n_replicas)
+
+    best_x, best_c, acc_rates = anneal(index, s, clause_mask, occ_tab, sign_tab, inst,
+                                       beta_list, mcmc_steps, rng, early_stopping)
+
+    # best replica of each instance
+    best_r = np.argmin(best_c.reshape(len(problems), n_replicas), axis=1) + np.arange(len(problems)) * n_replicas
+    solved = (best_c[best_r] == 0)
+    return solved, best_c[best_r], best_x[best_r], [acc_rates[r] for r in best_r]
+
+
+## Parallel tempering (replica exchange) on one KSAT instance.
+## One configuration is held at each finite beta of the usual linear/log schedule
+## (the anneal_steps - 1 betas between beta0 and beta1) and all of them run Metropolis
+## steps in lockstep. Every `swap_every` steps, swaps between neighbouring temperatures
+## are attempted (alternating even and odd pairs) and accepted with probability
+## min(1, exp((beta_k - beta_k+1) * (c_k - c_k+1))).
+## Each configuration performs mcmc_steps steps in total, so the flip budget is about the
+## same as a simann run with the same anneal_steps and mcmc_steps.
+## Returns the best configuration found (as a copy of probl), the (beta, acceptance rate)
+## pairs of every temperature and the ((beta_k, beta_k+1), swap acceptance rate) pairs of
+## every couple of neighbouring temperatures. With early stopping, the run ends at the
+## first swap round after a solution has been found.
+def partemp(probl,
+            anneal_steps = 10, mcmc_steps = 100,
+            beta0 = 0.1, beta1 = 10.0,
+            seed = None, logspace = False, early_stopping = True, swap_every = 10):
+    rng = np.random.default_rng(seed)
+    betas = beta_schedule(anneal_steps, beta0, beta1, logspace)[:-1]
+    T = len(betas)
+
+    index, s, clause_mask, occ_tab, sign_tab = pack([probl])
+    inst = np.zeros(T, dtype=int)
+
+    X, nsat, c = init_state(index, s, clause_mask, inst, probl.N, rng)
+    best_x = X.copy()
+    best_c = c.copy()
+
+    # temp_of_row[r] is the temperature index of row r, row_of_temp its inverse;
+    # swapping two temperatures only exchanges these labels, not the configurations
+    temp_of_row = np.arange(T)
+    row_of_temp = np.arange(T)
+    accepted = np.zeros(T, dtype=int)
+    swaps_tried = np.zeros(T - 1, dtype=int)
+    swaps_accepted = np.zeros(T - 1, dtype=int)
+
+    steps = 0
+    parity = 0
+    while steps < mcmc_steps:
+        if early_stopping and best_c.min() == 0:
+            break
+        n = min(swap_every, mcmc_steps - steps)
+        acc = mcmc(X, nsat, c, occ_tab, sign_tab, inst, betas[temp_of_row], n, rng, best_x, best_c)
+        accepted[temp_of_row] += acc
+        steps += n
+
+        # swap attempts between the pairs (k, k+1) with k of the current parity
+        k = np.arange(parity, T - 1, 2)
+        a, b = row_of_temp[k], row_of_temp[k + 1]
+        swap = rng.random(len(k)) < np.exp(np.minimum(0, (betas[k] - betas[k + 1]) * (c[a] - c[b])))
+        swaps_tried[k] += 1
+        swaps_accepted[k[swap]] += 1
+        a, b = a[swap], b[swap]
+        temp_of_row[a], temp_of_row[b] = temp_of_row[b], temp_of_row[a]
+        row_of_temp[temp_of_row[a]], row_of_temp[temp_of_row[b]] = a, b
+        parity = 1 - parity
+
+    acc_rates = [(beta, int(accepted[t]) / max(steps, 1)) for t, beta in enumerate(betas)]
+    swap_rates = [((betas[k], betas[k + 1]), int(swaps_accepted[k]) / max(int(swaps_tried[k]), 1)) for k in range(T - 1)]
+
+    best = probl.copy()
+    best.set_config(best_x[np.argmin(best_c)])
+    return best, acc_rates, swap_rates
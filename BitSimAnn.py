@@ -0,0 +1,141 @@
+import numpy as np
+
+from SimAnn import acceptance_table, beta_schedule
+
+## Bit-parallel (multi-spin coded) simulated annealing for K-SAT.
+## L configurations of one instance are packed into bit lanes: the configurations are stored as
+## an (N, W) array of uint64 words, W = ceil(L / 64), and bit l of word X[v] is the value of
+## variable v in lane l (1 for +1, 0 for -1). Lanes are numbered through the little-endian
+## byte view of the words, the one used by np.packbits/np.unpackbits(bitorder="little").
+##
+## A literal of sign s on variable v is true in the lanes X[v] ^ neg, with neg all ones if s = -1
+## and 0 otherwise, and a clause is satisfied in the OR of the words of its K literals: one
+## bitwise operation evaluates the clause for 64 configurations at once.
+##
+## In the annealing, all the lanes propose a flip of the same variable at each step (as in
+## multi-spin coding for spin models), and each lane accepts or rejects it with its own uniform.
+## The proposed variable is drawn independently of the configurations, so each lane on its own
+## is a valid Metropolis chain. The lanes are not independent of each other, though: they share
+## the sequence of proposed variables, so their trajectories are correlated, and statistics over
+## the lanes (e.g. the fraction of solved lanes as an estimate of the solving probability) are
+## not those of independent samples.
+
+ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+## Bits of the words (..., W) as an (..., 64 * W) array of 0/1 uint8, one per lane
+def lanes(words):
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=-1, bitorder="little")
+
+## Pack a boolean array (..., L) into words (..., W), lanes beyond L set to 0
+def pack_bits(bits):
+    L = bits.shape[-1]
+    if L % 64 == 0:
+        return np.ascontiguousarray(np.packbits(bits, axis=-1, bitorder="little")).view(np.uint64)
+    W = -(-L // 64)
+    padded = np.zeros(bits.shape[:-1] + (64 * W,), dtype=bool)
+    padded[..., :L] = bits
+    return np.packbits(padded, axis=-1, bitorder="little").view(np.uint64)
+
+## Pack L configurations, an (L, N) array of +-1, into (N, W) words
+def pack(X):
+    return pack_bits(X.T == 1)
+
+## Unpack (N, W) words into the (L, N) array of +-1 of the first L lanes
+def unpack(Xw, L):
+    return lanes(Xw)[:, :L].T.astype(int) * 2 - 1
+
+## Sign masks of the literals of a KSAT instance (clauses of the same length K): (M, K) words,
+## all ones for the negated literals
+def sign_masks(probl):
+    if probl.K is None:
+        raise Exception("bit-parallel annealing needs clauses of the same length")
+    return np.where(probl.s == -1, ALL, np.uint64(0))
+
+## Satisfied lanes of the given clauses (all of them by default), as (len(clauses), W) words
+def satisfied(Xw, index, neg, clauses = slice(None)):
+    return np.bitwise_or.reduce(Xw[index[clauses]] ^ neg[clauses][:, :, None], axis=1)
+
+## Cost (number of unsatisfied clauses) of every lane
+def lane_costs(Xw, index, neg):
+    return lanes(~satisfied(Xw, index, neg)).sum(axis=0, dtype=int)
+
+## Occurrence tables for the delta costs, in the order of probl.occ_clause (grouped by variable):
+## for the occurrence of variable v in clause m, the other K-1 variables of m and their sign
+## masks, and the sign mask of v in m.
+def occurrence_masks(probl):
+    neg = sign_masks(probl)
+    var = np.repeat(np.arange(probl.N), np.diff(probl.occ_offsets))
+    own = (probl.index[probl.occ_clause] == var[:, None])
+    other_var = probl.index[probl.occ_clause][~own].reshape(len(var), probl.K - 1)
+    other_neg = neg[probl.occ_clause][~own].reshape(len(var), probl.K - 1)
+    own_neg = neg[probl.occ_clause][own]
+    return probl.occ_offsets, other_var, other_neg, own_neg
+
+## Delta cost of flipping variable v in every lane, with the tables of occurrence_masks.
+## A clause of v is broken by the flip in the lanes where the literal of v is its only true
+## literal, and made in those where none of its literals is true: with `free` the lanes where
+## the other K-1 literals are all false, breaks are lit & free and makes ~lit & free.
+def lane_delta_costs(Xw, v, masks):
+    occ_offsets, other_var, other_neg, own_neg = masks
+    a, b = occ_offsets[v], occ_offsets[v+1]
+    free = ~np.bitwise_or.reduce(Xw[other_var[a:b]] ^ other_neg[a:b, :, None], axis=1)
+    lit = Xw[v] ^ own_neg[a:b, None]
+    counts = lanes(np.stack((lit & free, ~lit & free))).sum(axis=1, dtype=int)
+    return counts[0] - counts[1]
+
+## `len(moves)` Metropolis steps on all the lanes at once, with the shared proposed variables
+## `moves`, the (len(moves), lanes) uniforms and the acceptance table of the current beta.
+## Xw, c, best_w, best_c and accepted are updated in place (best_w keeps the configuration of
+## the best cost seen by each lane).
+def mcmc(Xw, c, masks, moves, uniforms, table, best_w, best_c, accepted):
+    L = len(c)
+    for v, u in zip(moves.tolist(), uniforms):
+        delta = lane_delta_costs(Xw, v, masks)[:L]
+        ## Metropolis rule, lane by lane
+        acc = (delta <= 0) | (u < table[np.maximum(delta, 0)])
+        Xw[v] ^= pack_bits(acc)
+        c += delta * acc
+        accepted += acc
+        better = (c < best_c)
+        if better.any():
+            m = pack_bits(better)
+            best_w[:] = (best_w & ~m) | (Xw & m)
+            best_c[better] = c[better]
+
+## Anneal `n_lanes` random configurations of the same KSAT instance (fixed K, correlated lanes), packed
+## 64 per machine word. Same schedule and return values as BatchSimAnn.simann_replicas: the best
+## configuration of each lane as an (L, N) array, the best costs and, for every lane, the list of
+## (beta, acceptance rate) pairs. With early stopping, the run ends after the first annealing step
+## at which one of the lanes has found a solution.
+def simann_lanes(probl, n_lanes = 64,
+                 anneal_steps = 10, mcmc_steps = 100,
+                 beta0 = 0.1, beta1 = 10.0,
+                 seed = None, logspace = False, early_stopping = True):
+    rng = np.random.default_rng(seed)
+    beta_list = beta_schedule(anneal_steps, beta0, beta1, logspace)
+    index, neg = probl.index, sign_masks(probl)
+    masks = occurrence_masks(probl)
+    L = n_lanes
+
+    Xw = pack(rng.choice([-1,1], size=(L, probl.N)))
+    c = lane_costs(Xw, index, neg)[:L]
+
+    ## Keep the best cost seen so far by each lane, and its associated configuration.
+    best_w = Xw.copy()
+    best_c = c.copy()
+
+    acc_rates = [[] for _ in range(L)]
+
+    # Main loop of the annealing: Loop over the betas
+    for beta in beta_list:
+        if early_stopping and np.any(best_c == 0):
+            break
+        table = acceptance_table(beta, probl.max_delta())
+        moves = rng.integers(probl.N, size=mcmc_steps)
+        uniforms = rng.random((mcmc_steps, L))
+        accepted = np.zeros(L, dtype=int)
+        mcmc(Xw, c, masks, moves, uniforms, table, best_w, best_c, accepted)
+        for l in range(L):
+            acc_rates[l].append((beta, int(accepted[l]) / mcmc_steps))
+
+    return unpack(best_w, L), best_c, acc_rates
@@ -0,0 +1,163 @@
+import re
+import warnings
+
+import numpy as np
+
+"""
+Reading and writing of CNF formulas in the DIMACS format.
+
+Clauses are kept in flat (CSR) form: the literals of clause m are
+lit_var[clause_offsets[m]:clause_offsets[m+1]], with lit_var the 0-based variables (int32)
+and lit_sign their signs (int8, +1 or -1). Clauses can have any length.
+"""
+
+
+# lines that are not clauses: comments, the problem line and the "%" end marker of some benchmark sets
+_special_line = re.compile(rb"(?m)^[ \t]*([cp%])[^\n]*\n?")
+
+
+def read_dimacs(path, chunk_size=1 << 22):
+
+    """Stream a DIMACS CNF file in chunks of chunk_size bytes, without building per-line
+    Python objects, and return (N, lit_var, lit_sign, clause_offsets).
+    Repeated literals inside a clause are merged, and clauses containing both a variable
+    and its negation (always satisfied) are dropped."""
+
+    N = None
+    parts_var, parts_sign, parts_ends = [], [], []
+    n_lits = 0
+    # number of lines before the current chunk, for error messages
+    n_lines = 0
+    pending = b""
+    done = False
+    with open(path, "rb") as f:
+        while not done:
+            chunk = f.read(chunk_size)
+            if chunk:
+                # only complete lines are parsed, the rest waits for the next chunk
+                data = pending + chunk
+                cut = data.rfind(b"\n") + 1
+                data, pending = data[:cut], data[cut:]
+            else:
+                data, pending, done = pending + b"\n", b"", True
+
+            for match in _special_line.finditer(data):
+                if match.group(1) == b"p":
+                    fields = match.group(0).split()
+                    if len(fields) < 4 or fields[1] != b"cnf":
+                        raise Exception(f"invalid DIMACS problem line: {match.group(0).strip()!r}")
+                    N = int(fields[2])
+                elif match.group(1) == b"%":
+                    data, done = data[:match.start()], True
+                    break
+            first_line = n_lines + 1
+            n_lines += data.count(b"\n")
+            clauses = _special_line.sub(b"", data)
+            if not clauses.strip():
+                continue
+
+            try:
+                with warnings.catch_warnings():
+                    # older numpy versions only warn when they stop at a token that is not an integer
+                    warnings.simplefilter("error", DeprecationWarning)
+                    tokens = np.fromstring(clauses, dtype=np.int64, sep=" ")
+            except (ValueError, DeprecationWarning):
+                raise Exception(f"{path}, line {_bad_line(data, first_line)}: invalid literal, "
+                                f"DIMACS clauses only contain integers") from None
+            zero = (tokens == 0)
+            lits = tokens[~zero]
+            # number of literals read before each clause terminator
+            ends = np.flatnonzero(zero) - np.arange(np.count_nonzero(zero)) + n_lits
+            parts_var.append((np.abs(lits) - 1).astype(np.int32))
+            parts_sign.append(np.sign(lits).astype(np.int8))
+            parts_ends.append(ends)
+            n_lits += len(lits)
+
+    # the empty arrays keep the dtypes of a formula without clauses
+    lit_var = np.concatenate([np.empty(0, dtype=np.int32)] + parts_var)
+    lit_sign = np.concatenate([np.empty(0, dtype=np.int8)] + parts_sign)
+    ends = np.concatenate([np.empty(0, dtype=np.int64)] + parts_ends)
+    # a last clause without terminator
+    if n_lits > (ends[-1] if len(ends) else 0):
+        ends = np.append(ends, n_lits)
+    clause_offsets = np.concatenate([[0], ends])
+
+    if N is None:
+        N = int(lit_var.max(initial=-1)) + 1
+    elif len(lit_var) and lit_var.max() >= N:
+        raise Exception(f"variable {lit_var.max() + 1} out of range, the problem line declares {N} variables")
+
+    lit_var, lit_sign, clause_offsets = normalize(lit_var, lit_sign, clause_offsets)
+    return N, lit_var, lit_sign, clause_offsets
+
+
+def _bad_line(data, first_line):
+
+    """Number of the first clause line of data (which starts at line first_line) with a token
+    that is not an integer"""
+
+    for i, line in enumerate(data.split(b"\n")):
+        if _special_line.match(line + b"\n"):
+            continue
+        for token in line.split():
+            try:
+                int(token)
+            except ValueError:
+                return first_line + i
+    return first_line
+
+
+def normalize(lit_var, lit_sign, clause_offsets, chunk_size=1 << 16):
+
+    """Merge repeated literals inside a clause and drop the clauses with complementary literals.
+    Repeated variables are looked for chunk_size clauses at a time, and the formula is only
+    rebuilt if some are found"""
+
+    M = len(clause_offsets) - 1
+    keep, tautology = None, None
+    for first in range(0, M, chunk_size):
+        last = min(first + chunk_size, M)
+        start, stop = clause_offsets[first], clause_offsets[last]
+        lengths = np.diff(clause_offsets[first:last+1])
+        lit_clause = np.repeat(np.arange(last - first), lengths)
+        var, sign = lit_var[start:stop], lit_sign[start:stop]
+        order = np.lexsort((var, lit_clause))
+        same = (lit_clause[order[1:]] == lit_clause[order[:-1]]) & (var[order[1:]] == var[order[:-1]])
+        if not same.any():
+            continue
+        if keep is None:
+            keep = np.ones(len(lit_var), dtype=bool)
+            tautology = np.zeros(M, dtype=bool)
+        chunk_tautology = tautology[first:last]
+        chunk_tautology[lit_clause[order[1:]][same & (sign[order[1:]] != sign[order[:-1]])]] = True
+        chunk_keep = keep[start:stop]
+        chunk_keep[order[1:][same]] = False
+        chunk_keep &= ~chunk_tautology[lit_clause]
+    if keep is None:
+        return lit_var, lit_sign, clause_offsets
+
+    lengths = np.diff(clause_offsets)
+    for first in range(0, M, chunk_size):
+        last = min(first + chunk_size, M)
+        start, stop = clause_offsets[first], clause_offsets[last]
+        lit_clause = np.repeat(np.arange(last - first), lengths[first:last])
+        lengths[first:last] = np.bincount(lit_clause[keep[start:stop]], minlength=last - first)
+    clause_offsets = np.concatenate([[0], np.cumsum(lengths[~tautology])])
+    return lit_var[keep], lit_sign[keep], clause_offsets
+
+
+def write_dimacs(path, N, lit_var, lit_sign, clause_offsets, chunk_size=1 << 16):
+
+    """Write a formula in flat form to a DIMACS CNF file, chunk_size clauses at a time.
+    Every chunk is formatted with a single % over a template built from the clause lengths"""
+
+    M = len(clause_offsets) - 1
+    with open(path, "w") as f:
+        f.write(f"p cnf {N} {M}\n")
+        for first in range(0, M, chunk_size):
+            last = min(first + chunk_size, M)
+            start, stop = clause_offsets[first], clause_offsets[last]
+            lits = (lit_var[start:stop].astype(np.int64) + 1) * lit_sign[start:stop]
+            lengths = np.diff(clause_offsets[first:last+1]).tolist()
+            template = "".join(["%d " * length + "0\n" for length in lengths])
+            f.write(template % tuple(lits.tolist()))
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from KSAT import KSAT
+
+"""
+On-disk cache of randomly generated K-SAT instances.
+
+An instance is fully determined by its generation parameters (N, M, K, seed), so sweeps
+that reuse the same instances (e.g. the same grid for several mcmc_steps settings) can
+load them instead of generating them again. Every instance is stored as a directory of
+.npy files, named after the generation parameters and the storage format version, and is
+loaded with np.load(mmap_mode='r'): the arrays are never modified, and parallel workers
+loading the same instance share the same pages.
+
+If max_bytes is given, the least recently used instances are evicted whenever the cache
+grows beyond it. Several workers can share one cache directory: entries used in the last
+`evict_grace` seconds are never evicted (so the cache can exceed max_bytes for a while), an
+evicted entry is first renamed away, so it is either complete or absent, and a worker whose
+entry disappears anyway stores it again.
+"""
+
+# bump whenever the generator or the stored arrays change, so that old entries are not reused
+FORMAT_VERSION = 2
+
+# entries used more recently than this (seconds) are never evicted
+evict_grace = 60
+
+# attempts at loading an entry that keeps being evicted, before generating the instance in memory
+load_attempts = 3
+
+ARRAYS = ("lit_var", "lit_sign", "clause_offsets", "occ_offsets", "occ_clause", "occ_sign", "x")
+
+
+class InstanceCache:
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, N, M, K, seed):
+
+        """Directory of the instance with the given generation parameters"""
+
+        return os.path.join(self.cache_dir, f"v{FORMAT_VERSION}_N{N}_M{M}_K{K}_seed{seed}")
+
+    def load(self, N, M, K, seed, scores=False, proposal="uniform"):
+
+        """Same instance as KSAT(N, M, K, seed), loaded from the cache if present,
+        otherwise generated and stored"""
+
+        if seed is None:
+            raise Exception("only instances generated with a seed can be cached")
+        path = self.path(N, M, K, seed)
+        for _ in range(load_attempts):
+            try:
+                if not os.path.isdir(path):
+                    self.store(KSAT(N, M, K, seed), path)
+                # mark as recently used
+                os.utime(path)
+                arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in ARRAYS}
+                break
+            except FileNotFoundError:
+                # evicted by another worker in the meantime: store it again
+                continue
+        else:
+            return KSAT(N, M, K, seed, scores, proposal)
+        probl = KSAT.from_clauses(N, arrays["lit_var"], arrays["lit_sign"], arrays["clause_offsets"],
+                                  scores, proposal,
+                                  (arrays["occ_offsets"], arrays["occ_clause"], arrays["occ_sign"]))
+        # the initial configuration of KSAT(N, M, K, seed)
+        probl.set_config(arrays["x"])
+        return probl
+
+    def store(self, probl, path):
+
+        """Write the arrays of the instance to a temporary directory and move it into place
+        atomically, so that concurrent workers never see partial entries"""
+
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_")
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, name + ".npy"), getattr(probl, name))
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # another worker stored the same instance first
+            shutil.rmtree(tmp, ignore_errors=True)
+        if self.max_bytes is not None:
+            self.evict(keep=path)
+
+    def entries(self):
+
+        """(last use time, size in bytes, path) of all the cached instances"""
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                entries.append((os.stat(path).st_mtime, size, path))
+            except FileNotFoundError:
+                # evicted in the meantime by another worker
+                continue
+        return entries
+
+    def evict(self, keep=None):
+
+        """Remove the least recently used instances until the cache fits in max_bytes, sparing
+        those used in the last evict_grace seconds"""
+
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for last_use, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep or now - last_use < evict_grace:
+                continue
+            # rename first, so that other workers never see a partially removed entry
+            trash = os.path.join(self.cache_dir, f".evicted_{os.getpid()}_{os.path.basename(path)}")
+            try:
+                os.rename(path, trash)
+            except OSError:
+                # evicted (or being used again) by another worker
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
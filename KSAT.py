@@ -1,150 +1,546 @@
-import numpy as np
-from copy import deepcopy
-
-# BRIEF SUMMARY OF VARIABLES
-# N: number of variables in the problem
-# M: number of clauses
-# K: number of constraints in each clause
-# S: signs expected in each position
-# index: variable that shows up in each position
-# clauses: for every variable, indeices of clauses in which it shows up 
-
-class KSAT:
-    def __init__(self, N, M, K, seed = None):
-        if not (isinstance(K, int) and K >= 2):
-            raise Exception("k must be an int greater or equal than 2")
-        self.K = K
-        self.M = M
-        self.N = N
-
-        ## Optionally set up the random number generator state
-        if seed is not None:
-            np.random.seed(seed)
-    
-        # s is the sign matrix
-        s = np.random.choice([-1,1], size=(M,K))
-        
-        # index is the matrix reporting the index of the K variables of the m-th clause 
-        index = np.zeros((M,K), dtype = int)        
-        for m in range(M):
-            index[m] = np.random.choice(N, size=(K), replace=False)
-            
-        # Dictionary for keeping track of literals in clauses
-        clauses = []   
-        for n in range(N):
-            clauses.append([i for i, row in enumerate(index) if n in row])
-        
-        self.s, self.index, self.clauses = s, index, clauses        
-        
-        ## Initialize the configuration
-        x = np.ones(N, dtype=int)
-        self.x = x
-        self.init_config()
-
-    ## Initialize (or reset) the current configuration
-    def init_config(self):
-        N = self.N 
-        self.x[:] = np.random.choice([-1,1], size=(N))
-        
-        
-    ## Definition of the cost function
-    # Here you need to complete the function computing the cost using eq.(4) of pdf file
-    def cost(self):
-        s, x, index = self.s, self.x, self.index
-
-        # vectorized form 2 (the fastest):
-        # 1. for every clause m, do x[index[m]] to get the choices matched
-        # 2. look at choice * s[m] and check that there is at least one 1
-        # 3. for instance with "1 in " or max == 1 or .sum > -K
-        
-        choices = x[index]
-        res = np.max(choices * s, axis=1)
-        not_sat = (res==-1)
-        c = not_sat.sum()  
-        
-        return c 
-
-    def cost_np_prod(self):
-        # vectorized form 1 (with np.prod):
-        s, x, index = self.s, self.x, self.index
-        choices = x[index]
-        m = (1 - s * choices)/2
-        mp = np.prod(m, 1)
-        res = np.sum(mp)  
-
-        return res  
-    
-    def cost_for_loop(self):
-        M, K, s, x, index = self.M, self.K, self.s, self.x, self.index
-        # for loop implementation (very slow):
-        c = 0
-        for m in range(M):
-            sat = 1
-            for k in range(K):
-                var = index[m,k]
-                sat *= (1 - s[m,k]*x[var])/2
-            c += sat
-        
-        return c
-                
-      
-    ## Propose a valid random move. 
-    def propose_move(self):
-        N = self.N
-        move = np.random.choice(N)
-        return move
-    
-    ## Modify the current configuration, accepting the proposed move
-    def accept_move(self, move):
-        self.x[move] *= -1
-        
-    def naive_delta_cost(self, move):
-        old_c = self.cost()
-        new_probl = self.copy()
-        new_probl.accept_move(move)
-        new_c = new_probl.cost()
-        
-        return new_c - old_c
-        
-
-    ## Compute the extra cost of the move (new-old, negative means convenient)
-    # Here you need complete the compute_delta_cost function as explained in the pdf file
-    def compute_delta_cost(self, move):
-        M, K, s, x, index, clauses = self.M, self.K, self.s, self.x, self.index, self.clauses
-        
-        # find all clauses in which var is involved
-        
-        mask = clauses[move]
-        s_masked, index_masked = s[mask], index[mask]
-        
-        # compute the cost from these clauses
-        choices = x[index_masked]
-        res = np.max(choices * s_masked, axis=1)
-        not_sat = (res==-1)
-        c_old = not_sat.sum()
-        
-        # change the var
-        x[move] *= -1
-        
-        # recompute the score of these clauses
-        choices = x[index_masked]
-        res = np.max(choices * s_masked, axis=1)
-        not_sat = (res==-1)
-        c_new = not_sat.sum()
-        
-        x[move] *= -1
-        
-        # return the difference
-        return c_new - c_old
-    
-
-    ## Make an entirely independent duplicate of the current object.
-    def copy(self):
-        return deepcopy(self)
-    
-    ## The display function should not be implemented
-    def display(self):
-        pass
-
-    
-
+import numpy as np
+
+import Dimacs
+from copy import copy
+
+# BRIEF SUMMARY OF VARIABLES
+# N: number of variables in the problem
+# M: number of clauses
+# K: number of constraints in each clause (None if the clauses have different lengths)
+# lit_var, lit_sign, clause_offsets: the clauses in flat (CSR) form, the literals of clause m are
+#       lit_var[clause_offsets[m]:clause_offsets[m+1]] with signs lit_sign; lit_clause is the clause of each literal
+# S: signs expected in each position (an (M, K) view of lit_sign, None with clauses of different lengths)
+# index: variable that shows up in each position (an (M, K) view of lit_var, same as above)
+# occ_offsets, occ_clause, occ_sign: for every variable, the clauses in which it shows up (CSR form),
+#       with the sign of each occurrence
+# nsat: for every clause, number of true literals in the current configuration
+# brk, mk: (only with scores=True) for every variable, number of clauses that would become
+#          unsatisfied (break) or satisfied (make) by flipping it
+# crit: (only with scores=True) for every clause, sum of the variables with a true literal,
+#       i.e. the only true variable when nsat == 1
+# unsat, unsat_pos: (only with proposal="focused") the currently unsatisfied clauses are
+#       unsat[:c], and unsat_pos[m] is the position of clause m in unsat (-1 if satisfied)
+# delta_vars, delta_pos, delta_first: (only with scores=True, between track_deltas() and
+#       track_deltas(False)) the variables grouped by delta cost, see track_deltas
+#
+# Storage: variable and clause indices are int32 (int64 beyond 2^31 entries, see index_dtype),
+# signs and the configuration x are int8, nsat is int8 unless a clause has more than 127 literals.
+# crit, brk and mk stay int64. See memory_footprint. Generation and the occurrence index work
+# CHUNK entries at a time, so their int64 temporaries do not grow with the instance.
+
+class KSAT:
+    __slots__ = ("N", "M", "K", "scores", "proposal",
+                 "lit_var", "lit_sign", "clause_offsets", "lit_clause", "index", "s",
+                 "occ_offsets", "occ_clause", "occ_sign",
+                 "x", "nsat", "c", "crit", "brk", "mk", "unsat", "unsat_pos",
+                 "delta_vars", "delta_pos", "delta_first")
+
+    def __init__(self, N, M, K, seed = None, scores = False, proposal = "uniform"):
+        if not (isinstance(K, int) and K >= 2):
+            raise Exception("k must be an int greater or equal than 2")
+
+        ## Optionally set up the random number generator state
+        if seed is not None:
+            np.random.seed(seed)
+    
+        # s is the sign matrix
+        s = self.random_signs(M, K)
+        
+        # index is the matrix reporting the index of the K variables of the m-th clause 
+        index = self.random_index(N, M, K)
+
+        self.setup(N, index.ravel(), s.ravel(), np.arange(0, M*K + 1, K, dtype=self.index_dtype(M*K + 1)),
+                   scores, proposal)
+
+    ## Build an instance from its clauses in flat form: the literals of clause m are
+    ## lit_var[clause_offsets[m]:clause_offsets[m+1]] (0-based variables) with signs lit_sign.
+    ## Clauses may have different lengths. The occurrence index (occ_offsets, occ_clause, occ_sign)
+    ## can be passed if already available, e.g. when loading a cached instance.
+    @classmethod
+    def from_clauses(cls, N, lit_var, lit_sign, clause_offsets, scores = False, proposal = "uniform",
+                     occurrences = None):
+        probl = cls.__new__(cls)
+        probl.setup(N, lit_var, lit_sign, clause_offsets, scores, proposal, occurrences)
+        return probl
+
+    ## Load an instance from a DIMACS CNF file (see Dimacs.read_dimacs)
+    @classmethod
+    def from_dimacs(cls, path, scores = False, proposal = "uniform"):
+        N, lit_var, lit_sign, clause_offsets = Dimacs.read_dimacs(path)
+        return cls.from_clauses(N, lit_var, lit_sign, clause_offsets, scores, proposal)
+
+    ## Save the instance to a DIMACS CNF file
+    def to_dimacs(self, path):
+        Dimacs.write_dimacs(path, self.N, self.lit_var, self.lit_sign, self.clause_offsets)
+
+    def setup(self, N, lit_var, lit_sign, clause_offsets, scores, proposal, occurrences = None):
+        M = len(clause_offsets) - 1
+        lengths = np.diff(clause_offsets)
+        self.N = N
+        self.M = M
+        # if scores is True, break/make counters for every variable are kept up to date
+        # and compute_delta_cost becomes a single lookup
+        self.scores = scores
+        # if proposal is "focused", moves flip a variable of a random unsatisfied clause
+        # (see propose_move) and the set of unsatisfied clauses is kept up to date
+        if proposal not in ("uniform", "focused"):
+            raise Exception("proposal must be 'uniform' or 'focused'")
+        self.proposal = proposal
+
+        # compact dtypes (no copy if the arrays already have them, e.g. memory-mapped from a cache)
+        lit_var = np.asarray(lit_var, dtype=self.index_dtype(N))
+        lit_sign = np.asarray(lit_sign, dtype=np.int8)
+        clause_offsets = np.asarray(clause_offsets, dtype=self.index_dtype(len(lit_var) + 1))
+        self.lit_var, self.lit_sign, self.clause_offsets = lit_var, lit_sign, clause_offsets
+        self.lit_clause = np.repeat(np.arange(M, dtype=self.index_dtype(M)), lengths)
+
+        # with clauses of the same length K, index and s are (M, K) views of the flat arrays
+        if M > 0 and (lengths == lengths[0]).all():
+            self.K = int(lengths[0])
+            self.index, self.s = lit_var.reshape(M, self.K), lit_sign.reshape(M, self.K)
+        else:
+            self.K = None
+            self.index, self.s = None, None
+            
+        # CSR occurrence index: the clauses in which variable n shows up are
+        # occ_clause[occ_offsets[n]:occ_offsets[n+1]], with the matching signs in occ_sign
+        if occurrences is None:
+            occurrences = self.occurrences(lit_var, lit_sign, self.lit_clause, N)
+        occ_offsets, occ_clause, occ_sign = occurrences
+        self.occ_offsets, self.occ_clause, self.occ_sign = occ_offsets, occ_clause, occ_sign
+        
+        ## Initialize the configuration
+        self.delta_vars = self.delta_pos = self.delta_first = None
+        x = np.ones(N, dtype=np.int8)
+        self.x = x
+        self.nsat = np.zeros(M, dtype=np.int8 if lengths.max(initial=0) < 128 else np.int32)
+        self.init_config()
+
+    ## Smallest integer dtype (int32 or int64) for indices in range(n)
+    @staticmethod
+    def index_dtype(n):
+        return np.int32 if n < 2**31 else np.int64
+
+    ## Number of entries processed at once by random_signs, random_index and occurrences, so that
+    ## their int64 and float64 temporaries stay small whatever the size of the instance
+    CHUNK = 1 << 16
+
+    ## Draw the (M, K) int8 sign matrix, the same as np.random.choice([-1,1], size=(M,K)): the
+    ## generator only draws signs as int64, so they are drawn and cast CHUNK at a time
+    ## (consecutive draws continue the same random stream).
+    @staticmethod
+    def random_signs(M, K):
+        s = np.empty((M, K), dtype=np.int8)
+        rows = max(1, KSAT.CHUNK // K)
+        for first in range(0, M, rows):
+            last = min(first + rows, M)
+            s[first:last] = np.random.randint(2, size=(last - first, K)) * 2 - 1
+        return s
+
+    ## Draw the variables of all M clauses in bulk: K distinct variables per clause,
+    ## uniformly at random (same ensemble as one np.random.choice(N, K, replace=False) per clause).
+    ## Rows with a repeated variable are redrawn until none is left; when K is large compared
+    ## to N (most rows would collide) every row is a prefix of a random permutation instead.
+    ## Variables are drawn directly as index_dtype(N) (the same draws as int64), and the random
+    ## permutations CHUNK keys at a time.
+    @staticmethod
+    def random_index(N, M, K):
+        if K > N:
+            raise Exception("k cannot be greater than the number of variables")
+        dtype = KSAT.index_dtype(N)
+        if K * K > N:
+            index = np.empty((M, K), dtype=dtype)
+            rows = max(1, KSAT.CHUNK // N)
+            for first in range(0, M, rows):
+                last = min(first + rows, M)
+                index[first:last] = np.argsort(np.random.rand(last - first, N), axis=1)[:, :K]
+            return index
+        index = np.random.randint(N, size=(M,K), dtype=dtype)
+        rows = np.sort(index, axis=1)
+        bad = np.flatnonzero((rows[:,1:] == rows[:,:-1]).any(axis=1))
+        del rows
+        while len(bad) > 0:
+            index[bad] = np.random.randint(N, size=(len(bad),K), dtype=dtype)
+            rows = np.sort(index[bad], axis=1)
+            bad = bad[(rows[:,1:] == rows[:,:-1]).any(axis=1)]
+        return index
+
+    ## Build the variable -> clause occurrence index (a stable counting sort of the literals by
+    ## variable). Clauses of each variable come out in increasing order. The literals are placed
+    ## CHUNK at a time: a stable argsort of the chunk gives the rank of each literal among those of
+    ## its variable in the chunk, and fill[n] is the next free slot of variable n.
+    @staticmethod
+    def occurrences(lit_var, lit_sign, lit_clause, N):
+        occ_offsets = np.zeros(N + 1, dtype=KSAT.index_dtype(len(lit_var) + 1))
+        occ_offsets[1:] = np.cumsum(np.bincount(lit_var, minlength=N))
+        occ_clause = np.empty(len(lit_var), dtype=lit_clause.dtype)
+        occ_sign = np.empty(len(lit_var), dtype=lit_sign.dtype)
+        fill = occ_offsets[:-1].copy()
+        for first in range(0, len(lit_var), KSAT.CHUNK):
+            last = min(first + KSAT.CHUNK, len(lit_var))
+            order = np.argsort(lit_var[first:last], kind="stable")
+            var = lit_var[first:last][order]
+            start = np.flatnonzero(np.concatenate([[True], var[1:] != var[:-1]]))
+            counts = np.diff(np.append(start, len(var)))
+            rank = np.arange(len(var)) - np.repeat(start, counts)
+            dest = fill[var] + rank
+            occ_clause[dest] = lit_clause[first:last][order]
+            occ_sign[dest] = lit_sign[first:last][order]
+            fill[var[start]] += counts
+        return occ_offsets, occ_clause, occ_sign
+
+    ## Variables of the given clauses, concatenated
+    def clause_vars(self, clauses):
+        if self.index is not None:
+            return self.index[clauses].ravel()
+        start = self.clause_offsets[clauses]
+        lengths = self.clause_offsets[clauses + 1] - start
+        shift = np.repeat(start - np.cumsum(lengths) + lengths, lengths)
+        return self.lit_var[shift + np.arange(len(shift))]
+
+    ## Occurrences padded to a rectangular (N, D) table, D being the largest number of
+    ## occurrences of a variable. Padding entries point to a dummy clause M and have sign 0.
+    def occurrence_table(self):
+        N, M, occ_offsets = self.N, self.M, self.occ_offsets
+        degree = np.diff(occ_offsets)
+        D = degree.max(initial=0)
+        var = np.repeat(np.arange(N), degree)
+        pos = np.arange(len(var)) - occ_offsets[var]
+        occ_tab = np.full((N, D), M, dtype=self.occ_clause.dtype)
+        sign_tab = np.zeros((N, D), dtype=self.occ_sign.dtype)
+        occ_tab[var, pos] = self.occ_clause
+        sign_tab[var, pos] = self.occ_sign
+        return occ_tab, sign_tab
+
+    ## Initialize (or reset) the current configuration, drawing from the generator rng if given
+    def init_config(self, rng = None):
+        N = self.N 
+        if rng is None:
+            rng = np.random
+        self.x[:] = rng.choice([-1,1], size=(N))
+        self.compute_counts()
+
+    ## Set the current configuration to x (e.g. a previously saved one)
+    def set_config(self, x):
+        self.x[:] = x
+        self.compute_counts()
+
+    ## State needed to continue a run exactly where it stopped (used by simann checkpoints):
+    ## the configuration and, with the focused proposal, the order of the unsatisfied clauses,
+    ## on which the proposals depend. Everything else is recomputed from x.
+    def get_state(self):
+        state = dict(x=self.x)
+        if self.proposal == "focused":
+            state["unsat"] = self.unsat[:self.c]
+        return state
+
+    def set_state(self, state):
+        self.set_config(state["x"])
+        if self.proposal == "focused":
+            unsat = state["unsat"]
+            self.unsat[:len(unsat)] = unsat
+            self.unsat_pos[unsat] = np.arange(len(unsat))
+
+    ## Recompute from scratch the number of true literals in every clause and the cached cost.
+    ## Must be called whenever x is changed without going through accept_move.
+    def compute_counts(self):
+        M, x, lit_var, lit_clause = self.M, self.x, self.lit_var, self.lit_clause
+        true = (x[lit_var] * self.lit_sign == 1)
+        self.nsat[:] = np.bincount(lit_clause[true], minlength=M)
+        self.c = int(np.count_nonzero(self.nsat == 0))
+        if self.scores:
+            self.crit = np.bincount(lit_clause[true], weights=lit_var[true], minlength=M).astype(int)
+            self.brk, self.mk = self.break_make()
+            if self.delta_vars is not None:
+                self.track_deltas()
+        if self.proposal == "focused":
+            unsat = np.flatnonzero(self.nsat == 0)
+            self.unsat = np.zeros(self.M, dtype=lit_clause.dtype)
+            self.unsat[:len(unsat)] = unsat
+            self.unsat_pos = np.full(self.M, -1, dtype=lit_clause.dtype)
+            self.unsat_pos[unsat] = np.arange(len(unsat))
+
+    ## Break and make counts of all the variables, computed from the clause counts
+    def break_make(self):
+        N, x, lit_var, lit_clause, nsat = self.N, self.x, self.lit_var, self.lit_clause, self.nsat
+        # a clause with one true literal is broken by flipping that literal's variable
+        critical = (nsat[lit_clause] == 1) & (x[lit_var] * self.lit_sign == 1)
+        brk = np.bincount(lit_var[critical], minlength=N)
+        # an unsatisfied clause is made by flipping any of its variables
+        mk = np.bincount(lit_var[nsat[lit_clause] == 0], minlength=N)
+        return brk, mk
+
+    ## Delta cost of flipping each one of the N variables
+    def all_delta_costs(self):
+        if self.scores:
+            return self.brk - self.mk
+        brk, mk = self.break_make()
+        return brk - mk
+        
+        
+    ## Definition of the cost function
+    # The number of unsatisfied clauses is kept up to date by accept_move, so this is O(1)
+    def cost(self):
+        return self.c
+
+    ## Cost recomputed from the configuration alone, ignoring the cached counts
+    # Here you need to complete the function computing the cost using eq.(4) of pdf file
+    def full_cost(self):
+        s, x, index = self.s, self.x, self.index
+        if index is None:
+            # clauses of different lengths: a clause is satisfied if any of its literals is true
+            true = (x[self.lit_var] * self.lit_sign == 1)
+            return self.M - int(np.count_nonzero(np.bincount(self.lit_clause[true], minlength=self.M)))
+
+        # vectorized form 2 (the fastest):
+        # 1. for every clause m, do x[index[m]] to get the choices matched
+        # 2. look at choice * s[m] and check that there is at least one 1
+        # 3. for instance with "1 in " or max == 1 or .sum > -K
+        
+        choices = x[index]
+        res = np.max(choices * s, axis=1)
+        not_sat = (res==-1)
+        c = not_sat.sum()  
+        
+        return c 
+
+    ## NOTE: the two alternative implementations below need clauses of the same length
+    def cost_np_prod(self):
+        # vectorized form 1 (with np.prod):
+        s, x, index = self.s, self.x, self.index
+        choices = x[index]
+        m = (1 - s * choices)/2
+        mp = np.prod(m, 1)
+        res = np.sum(mp)  
+
+        return res  
+    
+    def cost_for_loop(self):
+        M, K, s, x, index = self.M, self.K, self.s, self.x, self.index
+        # for loop implementation (very slow):
+        c = 0
+        for m in range(M):
+            sat = 1
+            for k in range(K):
+                var = index[m,k]
+                sat *= (1 - s[m,k]*x[var])/2
+            c += sat
+        
+        return c
+                
+      
+    ## Propose a valid random move. 
+    ## With the focused proposal, the move is a variable of a clause picked uniformly among the
+    ## unsatisfied ones (WalkSAT-style); if every clause is satisfied it falls back to the uniform one.
+    ## NOTE: the focused proposal is not symmetric, and no Hastings correction is applied
+    ## (the reverse move is not even proposable once the cost is 0): annealing with it is the
+    ## non-Metropolis "focused Metropolis search", that does not sample the Boltzmann distribution
+    ## but reaches cost 0 much faster at high M/N.
+    def propose_move(self, rng = None):
+        if rng is None:
+            rng = np.random
+        if self.proposal == "focused" and self.c > 0:
+            # one uniform picks both the clause (integer part) and the literal (fractional part)
+            u = rng.random() * self.c
+            m = self.unsat[int(u)]
+            start, stop = self.clause_offsets[m], self.clause_offsets[m+1]
+            if stop > start:
+                return int(self.lit_var[start + int((u - int(u)) * (stop - start))])
+        N = self.N
+        move = rng.choice(N)
+        return move
+
+    ## Propose n random moves at once, drawn from the generator rng.
+    ## Focused moves depend on the current configuration, so they are proposed lazily,
+    ## one at a time as the returned generator is consumed.
+    def propose_moves(self, n, rng):
+        if self.proposal == "focused":
+            return (self.propose_move(rng) for _ in range(n))
+        return rng.integers(self.N, size=n)
+
+    ## Largest possible change of the cost in one move: the number of clauses of the
+    ## variable that shows up the most
+    def max_delta(self):
+        return int(np.diff(self.occ_offsets).max(initial=0))
+    
+    ## Modify the current configuration, accepting the proposed move.
+    ## Only the clauses in which the variable shows up have their counts updated.
+    def accept_move(self, move):
+        if self.scores:
+            return self.accept_move_scores(move)
+        start, stop = self.occ_offsets[move], self.occ_offsets[move+1]
+        clauses = self.occ_clause[start:stop]
+        
+        # each occurrence loses a true literal if it was true, gains one otherwise
+        lit = self.occ_sign[start:stop] * self.x[move]
+        old = self.nsat[clauses]
+        new = old - lit
+        self.nsat[clauses] = new
+        self.c += int(np.count_nonzero(new == 0)) - int(np.count_nonzero(old == 0))
+        self.x[move] *= -1
+        if self.proposal == "focused":
+            self.update_unsat(clauses[(old == 0) & (new != 0)].tolist(), clauses[(old != 0) & (new == 0)].tolist())
+
+    ## accept_move with the break/make counters: the contributions of every touched clause move
+    ## from its old to its new count. A move touches a handful of clauses, so a plain loop over
+    ## Python ints is faster than vectorized updates (and np.add.at) on tiny arrays; only the
+    ## clauses that become (or stop being) unsatisfied need their variables.
+    ## While the delta classes are tracked, every change of brk[v] or mk[v] also moves v to
+    ## the neighbouring class (see shift_delta).
+    def accept_move_scores(self, move):
+        start, stop = self.occ_offsets.item(move), self.occ_offsets.item(move+1)
+        x_move = self.x.item(move)
+        nsat, crit, brk, mk = self.nsat, self.crit, self.brk, self.mk
+        nsat_at, crit_at, brk_at, mk_at = nsat.item, crit.item, brk.item, mk.item
+        shift = self.shift_delta if self.delta_vars is not None else None
+        satisfied, unsatisfied = [], []
+        for m, sign in zip(self.occ_clause[start:stop].tolist(), self.occ_sign[start:stop].tolist()):
+            # the literal loses its truth if it was true (lit = 1), gains it otherwise (lit = -1)
+            lit = sign * x_move
+            old = nsat_at(m)
+            new = old - lit
+            nsat[m] = new
+            v = crit_at(m)
+            if old == 1:
+                b = brk_at(v)
+                if shift:
+                    shift(v, b - mk_at(v), -1)
+                brk[v] = b - 1
+            elif old == 0:
+                satisfied.append(m)
+                for u in self.clause_vars_of(m):
+                    k = mk_at(u)
+                    if shift:
+                        shift(u, brk_at(u) - k, 1)
+                    mk[u] = k - 1
+            v -= lit * move
+            crit[m] = v
+            if new == 1:
+                b = brk_at(v)
+                if shift:
+                    shift(v, b - mk_at(v), 1)
+                brk[v] = b + 1
+            elif new == 0:
+                unsatisfied.append(m)
+                for u in self.clause_vars_of(m):
+                    k = mk_at(u)
+                    if shift:
+                        shift(u, brk_at(u) - k, -1)
+                    mk[u] = k + 1
+        self.c += len(unsatisfied) - len(satisfied)
+        self.x[move] = -x_move
+        if self.proposal == "focused":
+            self.update_unsat(satisfied, unsatisfied)
+
+    ## Group the variables by delta cost d = brk - mk (only with scores=True), for rejection-free
+    ## steps: the variables with delta d are delta_vars[delta_first[d+D]:delta_first[d+D+1]],
+    ## D being max_delta(), and delta_pos[n] is the position of variable n in delta_vars.
+    ## accept_move keeps the classes up to date until track_deltas(False) drops them. They are
+    ## Python lists, as they are only ever read and written one entry at a time.
+    def track_deltas(self, on = True):
+        if not on:
+            self.delta_vars = self.delta_pos = self.delta_first = None
+            return
+        N, D = self.N, self.max_delta()
+        delta = self.brk - self.mk
+        delta_vars = np.argsort(delta, kind="stable")
+        delta_pos = np.empty(N, dtype=delta_vars.dtype)
+        delta_pos[delta_vars] = np.arange(N)
+        self.delta_vars, self.delta_pos = delta_vars.tolist(), delta_pos.tolist()
+        self.delta_first = [0] + np.cumsum(np.bincount(delta + D, minlength=2 * D + 1)).tolist()
+
+    ## Move variable v from delta class d to d + step (step = 1 or -1) in O(1): v swaps places
+    ## with the last (first) variable of its class, and the class boundary moves past it.
+    def shift_delta(self, v, d, step):
+        delta_vars, delta_pos, delta_first = self.delta_vars, self.delta_pos, self.delta_first
+        # class d is delta_first[k]:delta_first[k+1], with k = d + D
+        k = d + (len(delta_first) >> 1) - 1
+        if step == 1:
+            k += 1
+            edge = delta_first[k] = delta_first[k] - 1
+        else:
+            edge = delta_first[k]
+            delta_first[k] = edge + 1
+        pos, other = delta_pos[v], delta_vars[edge]
+        delta_vars[pos], delta_pos[other] = other, pos
+        delta_vars[edge], delta_pos[v] = v, edge
+
+    ## Variables of clause m, as a list of Python ints
+    def clause_vars_of(self, m):
+        return self.lit_var[self.clause_offsets.item(m):self.clause_offsets.item(m+1)].tolist()
+
+    ## Remove the newly satisfied clauses (a list) from the unsatisfied set and add the newly
+    ## unsatisfied ones, in O(1) each (the removed entry is replaced by the last one)
+    def update_unsat(self, satisfied, unsatisfied):
+        unsat, unsat_pos = self.unsat, self.unsat_pos
+        n = self.c + len(satisfied) - len(unsatisfied)
+        for m in satisfied:
+            n -= 1
+            pos, last = unsat_pos[m], unsat[n]
+            unsat[pos], unsat_pos[last] = last, pos
+            unsat_pos[m] = -1
+        for m in unsatisfied:
+            unsat[n], unsat_pos[m] = m, n
+            n += 1
+        
+    def naive_delta_cost(self, move):
+        old_c = self.full_cost()
+        new_probl = self.copy()
+        new_probl.accept_move(move)
+        new_c = new_probl.full_cost()
+        
+        return new_c - old_c
+        
+
+    ## Compute the extra cost of the move (new-old, negative means convenient)
+    # Only the counts of the clauses in which the variable shows up are needed:
+    # a clause breaks if the literal is true and it is the only true one (count == 1),
+    # and it gets satisfied if it is currently unsatisfied (count == 0).
+    def compute_delta_cost(self, move):
+        if self.scores:
+            return int(self.brk[move] - self.mk[move])
+        start, stop = self.occ_offsets[move], self.occ_offsets[move+1]
+        lit = self.occ_sign[start:stop] * self.x[move]
+        counts = self.nsat[self.occ_clause[start:stop]]
+        
+        # return the difference
+        return int(np.count_nonzero(counts == lit)) - int(np.count_nonzero(counts == 0))
+    
+
+    ## Make an independent duplicate of the current object.
+    ## The instance data (clauses, occurrences) never changes after construction and is shared;
+    ## only the configuration and the quantities derived from it are duplicated.
+    def copy(self):
+        new = copy(self)
+        new.x, new.nsat = self.x.copy(), self.nsat.copy()
+        if self.scores:
+            new.crit, new.brk, new.mk = self.crit.copy(), self.brk.copy(), self.mk.copy()
+        if self.proposal == "focused":
+            new.unsat, new.unsat_pos = self.unsat.copy(), self.unsat_pos.copy()
+        if self.delta_vars is not None:
+            new.delta_vars, new.delta_pos = list(self.delta_vars), list(self.delta_pos)
+            new.delta_first = list(self.delta_first)
+        return new
+    
+    ## Memory used by the instance, in bytes: the arrays of the instance data (shared by copies),
+    ## those of the configuration and of the quantities derived from it (duplicated by copy())
+    ## and their totals. index and s are views of lit_var and lit_sign and are not counted.
+    def memory_footprint(self):
+        instance = ("lit_var", "lit_sign", "clause_offsets", "lit_clause", "occ_offsets", "occ_clause", "occ_sign")
+        state = ["x", "nsat"]
+        if self.scores:
+            state += ["crit", "brk", "mk"]
+        if self.proposal == "focused":
+            state += ["unsat", "unsat_pos"]
+        arrays = {name: int(getattr(self, name).nbytes) for name in instance + tuple(state)}
+        return dict(arrays=arrays,
+                    instance=sum(arrays[name] for name in instance),
+                    state=sum(arrays[name] for name in state),
+                    total=sum(arrays.values()))
+
+    ## The display function should not be implemented
+    def display(self):
+        pass
+
+    
+
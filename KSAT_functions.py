@@ -13,9 +13,9 @@ description of their scope.
 """
 
 
-def solve(ksat, mcmc_steps, anneal_steps, beta0, beta1, seed=seed, logspace=False, early_stopping=True):
+def solve(ksat, mcmc_steps, anneal_steps, beta0, beta1, seed=seed, logspace=False, early_stopping=True, observer=None):
 
-    """Solve a single instance of the K-SAT problem running SimAnn"""
+    """Solve a single instance of the K-SAT problem running SimAnn, reporting its progress to observer (see Observers.py)"""
 
     best, acc_rates = SimAnn.simann(ksat,
                           mcmc_steps = mcmc_steps, anneal_steps = anneal_steps,
@@ -23,11 +23,12 @@ def solve(ksat, mcmc_steps, anneal_steps, beta0, beta1, seed=seed, logspace=Fals
                           seed = seed,
                           debug_delta_cost = False,
                           logspace=logspace,
-                          early_stopping = early_stopping)
+                          early_stopping = early_stopping,
+                          observer = observer)
     return best, acc_rates
 
 
-def solve_multiple_M(N, M:list, K, mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping):
+def solve_multiple_M(N, M:list, K, mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping, observer=None):
 
     """Solve multiple instances of K-SAT for a fixed value of N and a list of M_s"""
 
@@ -36,7 +37,7 @@ def solve_multiple_M(N, M:list, K, mcmc_steps, anneal_steps, beta0, beta1, seed,
     for m in M:
         print(f"\nsolving {K}-SAT with {N} variables and {m} clauses:\n")
         ksat = KSAT.KSAT(N, m, K, seed)
-        best, acc_rates = solve(ksat, mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping)
+        best, acc_rates = solve(ksat, mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping, observer)
         solutions.append(best)
         acc_rates_dict[m] = acc_rates
 
@@ -0,0 +1,68 @@
+import warnings
+
+import numpy as np
+
+## Optional compiled inner loop of simann for KSAT instances (backend="numba").
+## If Numba is not installed, `available` is False and simann keeps using the Python loop.
+try:
+    import numba
+    available = True
+except ImportError:
+    available = False
+
+
+## One annealing step (mcmc_steps proposals at a fixed beta) on the flat arrays of a KSAT
+## instance. It consumes exactly the same pre-drawn moves and uniforms, and the same
+## acceptance table, as the Python loop of simann, so both follow the same trajectory.
+## x, nsat and best_x are modified in place; returns the new cost, best cost and the
+## number of accepted moves.
+def _mcmc_step(x, nsat, occ_offsets, occ_clause, occ_sign, moves, uniforms, table, c, best_x, best_c):
+    accepted = 0
+    for t in range(moves.shape[0]):
+        move = moves[t]
+        xm = x[move]
+        # delta cost: breaks minus makes (see KSAT.compute_delta_cost)
+        delta_c = 0
+        for j in range(occ_offsets[move], occ_offsets[move+1]):
+            lit = occ_sign[j] * xm
+            count = nsat[occ_clause[j]]
+            if count == lit:
+                delta_c += 1
+            elif count == 0:
+                delta_c -= 1
+        ## Metropolis rule
+        if delta_c <= 0 or uniforms[t] < table[delta_c]:
+            for j in range(occ_offsets[move], occ_offsets[move+1]):
+                nsat[occ_clause[j]] -= occ_sign[j] * xm
+            x[move] = -xm
+            c += delta_c
+            accepted += 1
+            if c <= best_c:
+                best_c = c
+                best_x[:] = x
+    return c, best_c, accepted
+
+if available:
+    _mcmc_step = numba.njit(cache=True)(_mcmc_step)
+
+
+## Whether the requested backend can be used, warning once if numba was requested but is missing
+def use_numba(backend):
+    if backend == "python":
+        return False
+    if backend != "numba":
+        raise Exception(f"unknown backend {backend!r}, use 'python' or 'numba'")
+    if not available:
+        warnings.warn("numba is not installed, falling back to the Python backend")
+    return available
+
+
+## Run one annealing step of simann on the KSAT instance `probl` with the compiled kernel,
+## keeping its cached cost (and break/make scores, if enabled) consistent.
+def mcmc_step(probl, moves, uniforms, table, c, best_x, best_c):
+    c, best_c, accepted = _mcmc_step(probl.x, probl.nsat, probl.occ_offsets, probl.occ_clause, probl.occ_sign,
+                                     moves, uniforms, np.asarray(table), c, best_x, best_c)
+    probl.c = int(c)
+    if probl.scores:
+        probl.compute_counts()
+    return int(c), int(best_c), int(accepted)
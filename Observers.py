@@ -0,0 +1,71 @@
+import numpy as np
+
+## Observers of a simann run, passed as simann(..., observer=...).
+## simann calls these hooks (all no-ops in the base class):
+##    start(beta_list, step, c)                   once, before the first annealing step to run
+##                                                #   (step > 0 when resuming from a checkpoint)
+##    step_start(i, beta)                         before annealing step i
+##    step_end(i, beta, acc_rate, c, best_c)      after it
+##    improved(i, best_c)                         after an annealing step that lowered the best cost
+##    solved(i)                                   after the annealing step that found the first solution
+##    end(best_c)                                 once, at the end of the run
+## With the default observer=None no hook is called, so a silent run pays nothing for them.
+class Observer:
+    def start(self, beta_list, step, c):
+        pass
+
+    def step_start(self, i, beta):
+        pass
+
+    def step_end(self, i, beta, acc_rate, c, best_c):
+        pass
+
+    def improved(self, i, best_c):
+        pass
+
+    def solved(self, i):
+        pass
+
+    def end(self, best_c):
+        pass
+
+
+## Print the progress of the run: the initial cost, one line per annealing step and the final cost
+class PrintObserver(Observer):
+    def start(self, beta_list, step, c):
+        if step == 0:
+            print(f"initial cost = {c}")
+        else:
+            print(f"resumed at step {step} with cost = {c}")
+
+    def step_end(self, i, beta, acc_rate, c, best_c):
+        print(f"acc.rate={acc_rate} beta={beta} c={c} [best={best_c}]")
+
+    def end(self, best_c):
+        print(f"final cost = {best_c}")
+
+
+## Record the beta, acceptance rate, cost and best cost of every annealing step into arrays
+## allocated once at the start of the run (one entry per beta of the schedule, NaN for the
+## steps that were not run), along with the step that found the first solution (-1 if none).
+## With the adaptive schedule the betas are not known in advance, and are recorded as the steps run.
+class Recorder(Observer):
+    def start(self, beta_list, step, c):
+        n = len(beta_list)
+        self.betas = np.array(beta_list, dtype=float)
+        self.acc_rates = np.full(n, np.nan)
+        self.costs = np.full(n, np.nan)
+        self.best_costs = np.full(n, np.nan)
+        self.initial_cost = c
+        self.n_steps = step
+        self.solved_step = -1
+
+    def step_end(self, i, beta, acc_rate, c, best_c):
+        self.betas[i] = beta
+        self.acc_rates[i] = acc_rate
+        self.costs[i] = c
+        self.best_costs[i] = best_c
+        self.n_steps = i + 1
+
+    def solved(self, i):
+        self.solved_step = i
@@ -0,0 +1,147 @@
+import json
+import time
+
+import numpy as np
+
+## Opt-in instrumentation of simann (simann(..., instrument=True) or instrument=k), returned
+## as a third value alongside acc_rates: per-phase nanosecond timers (time.perf_counter_ns) and
+## call counts, and per annealing step the number of proposals and flips (accepted moves),
+## proposals/sec, flips/sec, the copies of the problem and the best-state snapshots.
+##
+## Phases:
+##    propose        drawing the moves (in bulk, or one by one for lazy proposals)
+##    delta          probl.compute_delta_cost(move)
+##    accept         the Metropolis decision
+##    accept_move    probl.accept_move(move)
+##    snapshot       saving the best configuration (best_x[:] = probl.x)
+##    copy           probl.copy() (the final one, and those of debug_delta_cost)
+## To keep the overhead low, the phases of the inner loop are timed only on one proposal out of
+## every `sample_every` and scaled up to the number of calls, which are counted exactly.
+## Snapshots and copies are always timed. Steps run by the numba kernel or by the rejection-free
+## algorithm only report their totals.
+PHASES = ("propose", "delta", "accept", "accept_move", "snapshot", "copy")
+
+class Profile:
+    def __init__(self, sample_every = 16):
+        self.sample_every = sample_every
+        self.phase_ns = dict.fromkeys(PHASES, 0)
+        self.phase_calls = dict.fromkeys(PHASES, 0)
+        self.steps = []
+        self.step = None
+
+    ## Time a phase between tic() and toc(phase, calls)
+    def tic(self):
+        self.t = time.perf_counter_ns()
+
+    def toc(self, phase, calls = 1):
+        self.add(phase, time.perf_counter_ns() - self.t, calls)
+
+    ## Add ns nanoseconds and `calls` calls to a phase, in total and for the current annealing step
+    def add(self, phase, ns, calls = 1):
+        ns = int(ns)
+        self.phase_ns[phase] += ns
+        self.phase_calls[phase] += calls
+        if self.step is not None:
+            self.step["phase_ns"][phase] += ns
+            self.step["phase_calls"][phase] += calls
+
+    def step_start(self, i, beta):
+        self.step = dict(step=i, beta=float(beta),
+                         phase_ns=dict.fromkeys(PHASES, 0), phase_calls=dict.fromkeys(PHASES, 0))
+        self.step_t = time.perf_counter_ns()
+
+    def step_end(self, proposals, flips):
+        wall_ns = time.perf_counter_ns() - self.step_t
+        step = self.step
+        step.update(proposals=proposals, flips=flips, wall_ns=wall_ns,
+                    proposals_per_sec=proposals / wall_ns * 1e9 if wall_ns else 0.0,
+                    flips_per_sec=flips / wall_ns * 1e9 if wall_ns else 0.0,
+                    copies=step["phase_calls"]["copy"], snapshots=step["phase_calls"]["snapshot"],
+                    snapshot_ns=step["phase_ns"]["snapshot"])
+        self.steps.append(step)
+        self.step = None
+
+    ## Totals over the run
+    def summary(self):
+        proposals = sum(step["proposals"] for step in self.steps)
+        flips = sum(step["flips"] for step in self.steps)
+        wall_ns = sum(step["wall_ns"] for step in self.steps)
+        return dict(steps=len(self.steps), proposals=proposals, flips=flips, wall_ns=wall_ns,
+                    proposals_per_sec=proposals / wall_ns * 1e9 if wall_ns else 0.0,
+                    flips_per_sec=flips / wall_ns * 1e9 if wall_ns else 0.0,
+                    copies=self.phase_calls["copy"], snapshots=self.phase_calls["snapshot"],
+                    phase_ns=dict(self.phase_ns), phase_calls=dict(self.phase_calls))
+
+    def to_dict(self):
+        return dict(sample_every=self.sample_every, summary=self.summary(), steps=self.steps)
+
+    ## The profile as a JSON string, also written to `path` if given
+    def to_json(self, path = None):
+        text = json.dumps(self.to_dict(), indent=1)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+## Instrumented version of SimAnn.metropolis_step: the same loop, following the same trajectory,
+## with the phases of one proposal out of every profile.sample_every timed.
+def metropolis_step(probl, moves, uniforms, table, c, best_x, best_c, debug_delta_cost, profile):
+    clock = time.perf_counter_ns
+    k = profile.sample_every
+    lazy = not isinstance(moves, np.ndarray)
+    moves = iter(moves if lazy else moves.tolist())
+    table = table.tolist()
+    ns = dict.fromkeys(PHASES, 0)
+    sampled = dict.fromkeys(PHASES, 0)
+    calls = dict.fromkeys(PHASES, 0)
+    accepted = 0
+    for t, u in enumerate(uniforms.tolist()):
+        timed = (t % k == 0)
+        if timed:
+            t0 = clock()
+        move = next(moves)
+        if timed:
+            t1 = clock()
+        delta_c = probl.compute_delta_cost(move)
+        if timed:
+            ns["propose"] += t1 - t0
+            ns["delta"] += clock() - t1
+        if debug_delta_cost:
+            t_copy = clock()
+            probl_copy = probl.copy()
+            profile.add("copy", clock() - t_copy)
+            probl_copy.accept_move(move)
+            assert abs(c + delta_c - probl_copy.full_cost()) < 1e-10
+        if timed:
+            t2 = clock()
+        acc = delta_c <= 0 or u < table[delta_c]
+        if timed:
+            ns["accept"] += clock() - t2
+            sampled["delta"] += 1
+        if acc:
+            if timed:
+                t3 = clock()
+            probl.accept_move(move)
+            if timed:
+                ns["accept_move"] += clock() - t3
+                sampled["accept_move"] += 1
+            calls["accept_move"] += 1
+            c += delta_c
+            accepted += 1
+            if c <= best_c:
+                best_c = c
+                t4 = clock()
+                best_x[:] = probl.x
+                profile.add("snapshot", clock() - t4)
+
+    ## Scale the sampled times up to the number of calls (every proposal computes a delta and
+    ## a Metropolis decision, the accepted ones call accept_move)
+    n = len(uniforms)
+    scale = n / max(sampled["delta"], 1)
+    if lazy:
+        profile.add("propose", ns["propose"] * scale, 0)
+    profile.add("delta", ns["delta"] * scale, n)
+    profile.add("accept", ns["accept"] * scale, n)
+    profile.add("accept_move", ns["accept_move"] * calls["accept_move"] / max(sampled["accept_move"], 1), calls["accept_move"])
+    return c, best_c, accepted
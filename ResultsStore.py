@@ -0,0 +1,137 @@
+import inspect
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+import SimAnn
+
+"""
+Append-only store of the results of solving-probability sweeps, kept in a local SQLite file.
+
+Every annealing run of an instance is a row of the `runs` table, recorded (and committed) as
+soon as it completes, together with its parameters, best cost, number of proposed flips and
+wall time. A run is identified by the experiment label, (N, M, K), the root seed of the sweep,
+the annealing schedule (beta0, beta1, anneal, mcmc, logspace), the other solver options and the
+instance index, so a sweep that was interrupted can skip the runs that are already recorded.
+Sweeps without a seed are not reproducible and are never skipped.
+
+Aggregated results from the older hand-written csv files (data.csv, psat.csv) can be imported
+into the `legacy` table, and are returned by probabilities() together with the recorded runs.
+They are imported under their own experiment labels (legacy-data, legacy-psat), so that the
+aggregated probabilities of new runs and legacy rows never come back for the same (N, M) of
+one experiment.
+"""
+
+# columns of the aggregated solving probabilities, as in the legacy csv files
+COLUMNS = ("P", "N", "M", "K", "seed", "beta0", "beta1", "mcmc", "anneal", "logspace")
+
+# annealing schedule: column of the store and name of the simann parameter
+SCHEDULE = {"beta0": "beta0", "beta1": "beta1", "anneal": "anneal_steps", "mcmc": "mcmc_steps", "logspace": "logspace"}
+
+KEY = ("experiment", "K", "seed", "beta0", "beta1", "anneal", "mcmc", "logspace", "options")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    experiment TEXT, N INTEGER, M INTEGER, K INTEGER, seed INTEGER,
+    beta0 REAL, beta1 REAL, anneal INTEGER, mcmc INTEGER, logspace INTEGER, options TEXT,
+    instance INTEGER, cost INTEGER, flips INTEGER, wall_time REAL,
+    PRIMARY KEY (experiment, N, M, K, seed, beta0, beta1, anneal, mcmc, logspace, options, instance)
+);
+CREATE TABLE IF NOT EXISTS legacy (
+    experiment TEXT, P REAL, N INTEGER, M INTEGER, K INTEGER, seed INTEGER,
+    beta0 REAL, beta1 REAL, mcmc INTEGER, anneal INTEGER, logspace INTEGER
+);
+"""
+
+
+class ResultsStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def key(self, experiment, K, seed, params, batch=False):
+
+        """Columns identifying the runs of a sweep with the given simann (or simann_batch) parameters.
+        Schedule parameters missing from `params` take the simann defaults, the remaining parameters
+        are stored as a json string of options."""
+
+        defaults = {name: p.default for name, p in inspect.signature(SimAnn.simann).parameters.items()}
+        key = dict(experiment=experiment, K=K, seed=seed)
+        for column, name in SCHEDULE.items():
+            key[column] = params.get(name, defaults[name])
+        key["logspace"] = int(key["logspace"])
+        options = {name: value for name, value in params.items() if name not in SCHEDULE.values()}
+        if batch:
+            options["batch"] = True
+        key["options"] = json.dumps(options, sort_keys=True)
+        return key
+
+    def done(self, key):
+
+        """Best costs of the runs already recorded under `key`, as a dict {(N, M, instance): cost}"""
+
+        where = " AND ".join(f"{column} = ?" for column in KEY)
+        rows = self.db.execute(f"SELECT N, M, instance, cost FROM runs WHERE {where}",
+                               [key[column] for column in KEY])
+        return {(n, m, instance): cost for n, m, instance, cost in rows}
+
+    def record(self, key, n, m, instance, cost, flips, wall_time):
+
+        """Append the result of one run, committing it immediately"""
+
+        columns = KEY + ("N", "M", "instance", "cost", "flips", "wall_time")
+        values = [key[column] for column in KEY] + [n, m, instance, cost, flips, wall_time]
+        with self.db:
+            self.db.execute(f"INSERT OR IGNORE INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                            values)
+
+    def probabilities(self, **filters):
+
+        """Solving probabilities as a DataFrame with the columns of the legacy csv files, plus
+        the experiment label, the solver options and the number n_runs of runs (None for legacy rows).
+        Keyword arguments select rows by column value, e.g. probabilities(experiment="data", mcmc=1000)."""
+
+        columns = ", ".join(COLUMNS[1:])
+        query = f"""
+            SELECT * FROM (
+                SELECT AVG(cost = 0) AS P, {columns}, experiment, options, COUNT(*) AS n_runs FROM runs
+                GROUP BY experiment, N, M, K, seed, beta0, beta1, anneal, mcmc, logspace, options
+                UNION ALL
+                SELECT P, {columns}, experiment, NULL, NULL FROM legacy
+            )"""
+        for column in filters:
+            if column not in COLUMNS + ("experiment", "options", "n_runs"):
+                raise Exception(f"unknown column {column!r}")
+        if filters:
+            query += " WHERE " + " AND ".join(f"{column} = ?" for column in filters)
+        return pd.read_sql_query(query, self.db, params=list(filters.values()))
+
+    def import_csv(self, path, experiment=None):
+
+        """Import the aggregated results of a legacy semicolon-separated csv file (such as
+        data.csv or psat.csv) under `experiment` (by default 'legacy-' and the file name without extension).
+        Does nothing if that experiment already has legacy results. Returns the number of imported rows."""
+
+        if experiment is None:
+            experiment = "legacy-" + os.path.splitext(os.path.basename(path))[0]
+        if self.db.execute("SELECT COUNT(*) FROM runs WHERE experiment = ?", (experiment,)).fetchone()[0]:
+            raise Exception(f"experiment {experiment!r} already has recorded runs, import the csv under another label")
+        if self.db.execute("SELECT COUNT(*) FROM legacy WHERE experiment = ?", (experiment,)).fetchone()[0]:
+            return 0
+
+        data = pd.read_csv(path, sep=";", encoding="utf-8-sig")
+        data = data.loc[:, ~data.columns.str.contains('^Unnamed')]
+        data["logspace"] = data["logspace"].map({"F": 0, "T": 1, False: 0, True: 1})
+        data["experiment"] = experiment
+        columns = ("experiment",) + COLUMNS
+        rows = data[list(columns)].astype(object).values.tolist()
+        with self.db:
+            self.db.executemany(f"INSERT INTO legacy ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+        return len(rows)
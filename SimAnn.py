@@ -1,5 +1,13 @@
+import itertools
+import json
+import os
+import time
+
 import numpy as np
 
+import NumbaKernel
+import Profiling
+
 ## Stochastically determine whether to acccept a move according to the
 ## Metropolis rule (valid for symmetric proposals)
 def accept(delta_c, beta):
@@ -14,84 +22,492 @@ def accept(delta_c, beta):
     ## Returns True with probability p
     return np.random.rand() < p
 
+## Metropolis acceptance probabilities for all the possible cost increases at a given beta:
+## table[d] = exp(-beta * d) for d = 0, ..., max_delta (so table[0] = 1, and
+## table[d > 0] = 0 at beta = infinity). Valid for integer costs.
+def acceptance_table(beta, max_delta):
+    table = np.zeros(max_delta + 1)
+    table[0] = 1.0
+    if beta != np.inf:
+        table[1:] = np.exp(-beta * np.arange(1, max_delta + 1))
+    return table
+
+## One annealing step: the Metropolis rule applied to the pre-drawn moves, with the
+## pre-drawn uniforms and the acceptance probabilities of the current beta.
+## Returns the new cost, the best cost and the number of accepted moves.
+def metropolis_step(probl, moves, uniforms, table, c, best_x, best_c, debug_delta_cost=False):
+    if isinstance(moves, np.ndarray):
+        moves = moves.tolist()
+    table = table.tolist()
+    accepted = 0
+    # For each beta, perform a number of MCMC steps
+    for move, u in zip(moves, uniforms.tolist()):
+        #print(probl.x)
+        delta_c = probl.compute_delta_cost(move)
+        ## Optinal (expensive) check that `compute_delta_cost` works
+        if debug_delta_cost:
+            probl_copy = probl.copy()
+            probl_copy.accept_move(move)
+            assert abs(c + delta_c - probl_copy.full_cost()) < 1e-10
+        ## Metropolis rule (same as `accept`, with the precomputed probabilities)
+        #print(probl.x, c, move, delta_c, accept(delta_c, beta))
+
+        if delta_c <= 0 or u < table[delta_c]:
+            probl.accept_move(move)
+            #print(probl.x)
+            c += delta_c
+            accepted += 1
+            if c <= best_c:
+                best_c = c
+                best_x[:] = probl.x
+    return c, best_c, accepted
+
+## Run the Metropolis rule on the moves and uniforms of (part of) an annealing step with the
+## selected loop (numba kernel, instrumented or plain Python). With a budget (see Anytime.Budget)
+## the moves run in chunks of at most budget.allowance() proposals, the budget being charged
+## after each chunk, and the step stops early once it is exhausted; the chunks consume the same
+## pre-drawn moves and uniforms, so the trajectory does not change.
+## Returns the new cost, the best cost, the number of accepted moves and of proposals run.
+def run_moves(probl, moves, uniforms, table, c, best_x, best_c,
+              numba_backend = False, debug_delta_cost = False, profile = None, budget = None):
+    lazy = not isinstance(moves, np.ndarray)
+    n_moves = len(uniforms)
+    done = accepted = 0
+    while done < n_moves:
+        n = n_moves - done if budget is None else min(n_moves - done, budget.allowance())
+        part = slice(done, done + n)
+        chunk = itertools.islice(moves, n) if lazy else moves[part]
+        if numba_backend and not lazy:
+            c, best_c, a = NumbaKernel.mcmc_step(probl, chunk, uniforms[part], table, c, best_x, best_c)
+        elif profile is not None:
+            c, best_c, a = Profiling.metropolis_step(probl, chunk, uniforms[part], table, c, best_x, best_c,
+                                                     debug_delta_cost, profile)
+        else:
+            c, best_c, a = metropolis_step(probl, chunk, uniforms[part], table, c, best_x, best_c, debug_delta_cost)
+        accepted += a
+        done += n
+        if budget is not None and budget.spend(n):
+            break
+    return c, best_c, accepted, done
+
+## Rejection-free (n-fold way) version of one annealing step of `mcmc_steps` Metropolis
+## proposals. Instead of proposing and mostly rejecting moves, every event picks the move
+## directly, with probability proportional to its acceptance probability, and advances the
+## proposal counter by the number of proposals the Metropolis chain would have needed to
+## accept a move (geometrically distributed). The sequence of visited configurations has
+## the same distribution as with the plain Metropolis rule.
+## The variables are grouped by delta cost d in [-D, D] (KSAT.track_deltas, needs scores=True),
+## and the classes are kept up to date by accept_move. The moves with d <= 0 are always
+## accepted and come first, so every event picks a position among them, or else a class d > 0
+## with weight count[d] * table[d] in O(D), and then a uniform variable of the class.
+## Returns the new cost, the best cost and the number of accepted moves.
+def rejection_free_step(probl, table, mcmc_steps, rng, c, best_x, best_c):
+    N, D = probl.N, probl.max_delta()
+    probl.track_deltas()
+    delta_vars, first = probl.delta_vars, probl.delta_first
+    # acceptance probabilities of the classes d = 1, ..., D
+    weights = table[1:D + 1].tolist()
+    accepted = 0
+    t = 0
+    while True:
+        # number of moves with d <= 0, and total weight of the moves with d > 0
+        free = first[D + 1]
+        uphill = [(first[D + d + 1] - first[D + d]) * w for d, w in enumerate(weights, 1)]
+        uphill_sum = sum(uphill)
+        ## probability that one proposal is accepted; if it is 0 the chain is frozen
+        p = (free + uphill_sum) / N
+        if p == 0:
+            break
+        t += rng.geometric(min(p, 1.0))
+        if t > mcmc_steps:
+            break
+        u = rng.random() * (free + uphill_sum)
+        if u < free:
+            move = delta_vars[int(u)]
+        else:
+            u -= free
+            for d, w in enumerate(uphill, 1):
+                if w > 0:
+                    last = d
+                    if u < w:
+                        break
+                    u -= w
+            # u / table[d] is uniform in [0, count[d]) (up to rounding) for the picked class
+            size = first[D + last + 1] - first[D + last]
+            move = delta_vars[first[D + last] + min(int(u / weights[last - 1]), size - 1)]
+        delta_c = probl.compute_delta_cost(move)
+        probl.accept_move(move)
+        c += delta_c
+        accepted += 1
+        if c <= best_c:
+            best_c = c
+            best_x[:] = probl.x
+    probl.track_deltas(False)
+    return c, best_c, accepted
+
+## The annealing schedule: `anneal_steps` betas, linearly (or logarithmically)
+## spaced between beta0 and beta1, followed by a final step at beta = infinity.
+def beta_schedule(anneal_steps, beta0, beta1, logspace=False):
+    # First allocate an array with the required number of steps
+    beta_list = np.zeros(anneal_steps)
+    # All but the last one are evenly spaced between beta0 and beta1 (included)
+    beta_list[:-1] = np.linspace(beta0, beta1, anneal_steps - 1)
+    if logspace == True:
+        beta_list[:-1] = np.logspace(np.log10(beta0), np.log10(beta1), anneal_steps-1)
+    
+    
+    # The last one is set to infinty
+    beta_list[-1] = np.inf
+    return beta_list
+
+## Checkpoint of a simann run, taken after the annealing step of index `step` - 1: the state of
+## the problem (probl.get_state()), the costs, the best configuration, the acceptance rates so far
+## and the state of the random number generator, so that a resumed run continues exactly as the
+## original one would have. The schedule is saved too, to check that the run is resumed with the
+## same parameters. The file (a compressed npz) is written to a temporary file first and then
+## renamed, so an interruption never leaves a partial checkpoint behind.
+def save_checkpoint(path, probl, beta_list, step, c, best_x, best_c, solved, acc_rates, rng):
+    state = {"probl_" + key: value for key, value in probl.get_state().items()}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, beta_list=beta_list, step=step, c=c, best_x=best_x, best_c=best_c,
+                            solved=solved, rates=np.array([rate for _, rate in acc_rates]),
+                            rng_state=json.dumps(rng.bit_generator.state), **state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+## Restore the state saved by `save_checkpoint` into probl and rng.
+## Returns the index of the next annealing step, the costs, the best configuration,
+## the solved flag and the acceptance rates.
+def load_checkpoint(path, probl, beta_list, rng):
+    with np.load(path) as data:
+        if not np.array_equal(data["beta_list"], beta_list):
+            raise Exception(f"the checkpoint {path} was saved with a different annealing schedule")
+        probl.set_state({key[len("probl_"):]: data[key] for key in data.files if key.startswith("probl_")})
+        rng.bit_generator.state = json.loads(str(data["rng_state"]))
+        step = int(data["step"])
+        acc_rates = list(zip(beta_list[:step], data["rates"].tolist()))
+        return step, data["c"].item(), data["best_x"], data["best_c"].item(), bool(data["solved"]), acc_rates
+
 ## The simulated annealing generic solver.
-## Assumes that the proposals are symmetric.
+## Assumes that the proposals are symmetric and that the costs are integers.
 ## The `probl` object must implement these methods:
-##    init_config()               # returns None [changes internal config]
+##    init_config(rng)            # returns None [changes internal config, drawing from rng]
 ##    cost()                      # returns a real number
-##    propose_move()              # returns a (problem-dependent) move - must be symmetric!
+##    full_cost()                 # same, recomputed from scratch (only used with debug_delta_cost)
+##    propose_moves(n, rng)       # returns n (problem-dependent) moves drawn from rng, as an array or
+##                                #   a lazy iterable - should be symmetric!
+##    max_delta()                 # returns an upper bound on the cost increase of a move
 ##    compute_delta_cost(move)    # returns a real number
 ##    accept_move(move)           # returns None [changes internal config]
 ##    copy()                      # returns a new, independent opbject
+##    x                           # the configuration, a numpy array
+##    set_config(x)               # returns None [sets the internal config to a copy of x]
 ## NOTE: The default beta0 and beta1 are arbitrary.
+## With backend="numba" (KSAT instances only, numba must be installed) the MCMC steps
+## at each beta run in a compiled loop that follows exactly the same trajectory as the
+## Python one; if numba is missing the Python loop is used.
+## If probl proposes moves lazily (e.g. KSAT(..., proposal="focused"), whose proposals are not
+## symmetric), the same Metropolis rule is applied without Hastings correction: this is the
+## focused Metropolis search, a non-Metropolis heuristic, and the Python loop is always used.
+## If rejection_free is set to an acceptance rate (e.g. 0.05), every annealing step that
+## follows one with a lower acceptance rate uses `rejection_free_step` (needs
+## probl.scores, see KSAT(..., scores=True)); the recorded acceptance rate is the equivalent one
+## of the Metropolis chain. An event costs about 30 us whatever N, against 2-3 us for a Metropolis
+## proposal with scores=True (measured on KSAT(20000, 84000, 3) and KSAT(10^5, 4.2*10^5, 3) at
+## beta 4-6), so rejection-free steps only pay off below an acceptance rate of about 0.08, and
+## the gain then grows as 1 / (acceptance rate).
+## If checkpoint is set to a file path, the state of the run is saved there (see save_checkpoint)
+## every checkpoint_every annealing steps and/or whenever checkpoint_seconds have passed since the
+## last save (checked at the end of each annealing step), and at the end of the run.
+## resume=path continues the run saved in that checkpoint, with the same probl, parameters
+## and seed, bit-for-bit as if it had never stopped.
+## Checkpoints need two more methods of probl:
+##    get_state()                 # returns a dict of arrays from which the run can be continued exactly
+##    set_state(state)            # returns None [restores the state returned by get_state]
+## With instrument=True (or instrument=k, to time one proposal out of every k instead of 16), the
+## phases of the run are timed (see Profiling.py) and simann returns (best, acc_rates, profile).
+## Nothing is printed: progress is reported to the optional observer (see Observers.py), e.g.
+## observer=PrintObserver() for the initial cost, one line per annealing step and the final cost.
+## With schedule="adaptive", the betas and the number of steps per beta are chosen online instead
+## (see simann_adaptive, which receives mcmc_steps, anneal_steps as the maximum number of annealing
+## steps, and the keyword arguments in the schedule_options dict); beta0, beta1 and logspace are
+## then ignored.
+## With a budget (e.g. Anytime.Budget(seconds=0.2) or Anytime.Budget(flips=10**7)), the run stops
+## as soon as the budget is exhausted, even in the middle of an annealing step (whose acceptance
+## rate is then that of the proposals that were run). The budget is checked between chunks of
+## proposals, so a deadline costs one clock reading every budget.check_every proposals. It needs:
+##    allowance()                 # returns the number of proposals that can run before the next check
+##    spend(n)                    # records n proposals, returns True once the budget is exhausted
+##    exhausted()                 # returns True once the budget is exhausted
+## Rejection-free steps are charged mcmc_steps proposals at their end.
 def simann(probl,
            anneal_steps = 10, mcmc_steps = 100,
            beta0 = 0.1, beta1 = 10.0,
-           seed = None, debug_delta_cost = False, logspace=False, early_stopping=True):
-    ## Optionally set up the random number generator state
-    if seed is not None:
-        np.random.seed(seed)
+           seed = None, debug_delta_cost = False, logspace=False, early_stopping=True,
+           backend = "python", rejection_free = None,
+           checkpoint = None, checkpoint_every = None, checkpoint_seconds = None, resume = None,
+           observer = None, instrument = None, schedule = "fixed", schedule_options = None, budget = None):
+    if budget is not None and (checkpoint is not None or resume is not None):
+        raise Exception("a budget cannot be combined with checkpoints")
+    if rejection_free is not None and not getattr(probl, "scores", False):
+        raise Exception("rejection-free steps need the break/make counters, use KSAT(..., scores=True)")
+    if schedule == "adaptive":
+        if checkpoint is not None or resume is not None or instrument or rejection_free is not None:
+            raise Exception("checkpoints, instrumentation and rejection-free steps need schedule='fixed'")
+        return simann_adaptive(probl, mcmc_steps, anneal_steps, seed=seed, debug_delta_cost=debug_delta_cost,
+                               early_stopping=early_stopping, backend=backend, observer=observer, budget=budget,
+                               **(schedule_options or {}))
+    if schedule != "fixed":
+        raise Exception(f"unknown schedule {schedule!r}, use 'fixed' or 'adaptive'")
+
+    ## Set up the random number generator of this run
+    rng = np.random.default_rng(seed)
+    numba_backend = NumbaKernel.use_numba(backend)
 
     # Set up the list of betas.
-    # First allocate an array with the required number of steps
-    beta_list = np.zeros(anneal_steps)
-    # All but the last one are evenly spaced between beta0 and beta1 (included)
-    beta_list[:-1] = np.linspace(beta0, beta1, anneal_steps - 1)
-    if logspace == True:
-        beta_list[:-1] = np.logspace(np.log10(beta0), np.log10(beta1), anneal_steps-1)
-    
-    
-    # The last one is set to infinty
-    beta_list[-1] = np.inf
+    beta_list = beta_schedule(anneal_steps, beta0, beta1, logspace)
 
-    # Set up the initial configuration, compute and print the initial cost
-    probl.init_config()
-    c = probl.cost()
-    print(f"initial cost = {c}")
-    #print(probl.x)
+    profile = None
+    if instrument:
+        profile = Profiling.Profile() if instrument is True else Profiling.Profile(instrument)
 
-    ## Keep the best cost seen so far, and its associated configuration.
-    best = probl.copy()
-    best_c = c
-    solved = False
-    
-    acc_rates = []
+    if resume is None:
+        # Set up the initial configuration and compute the initial cost
+        probl.init_config(rng)
+        c = probl.cost()
+        #print(probl.x)
+
+        ## Keep the best cost seen so far, and its associated configuration.
+        ## Only the configuration is snapshotted, into a preallocated buffer; the full
+        ## problem object is materialized once, at the end.
+        best_x = probl.x.copy()
+        best_c = c
+        solved = False
+        start = 0
+
+        acc_rates = []
+    else:
+        # Continue from the annealing step after the checkpoint
+        start, c, best_x, best_c, solved, acc_rates = load_checkpoint(resume, probl, beta_list, rng)
+
+    if observer is not None:
+        observer.start(beta_list, start, c)
+
+    last_save = time.monotonic()
 
     # Main loop of the annaling: Loop over the betas
     for i,beta in enumerate(beta_list):
+        if i < start:
+            continue
         if early_stopping and solved:
             break
-        ## At each beta, we want to record the acceptance rate, so we need a
-        ## counter for the number of accepted moves
-        accepted = 0
-        # For each beta, perform a number of MCMC steps
-        for t in range(mcmc_steps):
-            move = probl.propose_move()
-            #print(probl.x)
-            delta_c = probl.compute_delta_cost(move)
-            ## Optinal (expensive) check that `compute_delta_cost` works
-            if debug_delta_cost:
-                probl_copy = probl.copy()
-                probl_copy.accept_move(move)
-                assert abs(c + delta_c - probl_copy.cost()) < 1e-10
-            ## Metropolis rule
-            #print(probl.x, c, move, delta_c, accept(delta_c, beta))
-
-            if accept(delta_c, beta):
-                probl.accept_move(move)
-                #print(probl.x)
-                c += delta_c
-                accepted += 1
-                if c <= best_c:
-                    best_c = c
-                    best = probl.copy()
-                if not solved and c == 0:
-                    solved = True
-        acc_rate = accepted / mcmc_steps
+        if budget is not None and budget.exhausted():
+            break
+        if observer is not None:
+            observer.step_start(i, beta)
+        if profile is not None:
+            profile.step_start(i, beta)
+        prev_best_c = best_c
+        ## Acceptance probabilities of this beta, and all the randomness of this
+        ## annealing step, drawn in bulk. At each beta, we want to record the acceptance
+        ## rate, so every kind of step returns the number of accepted moves
+        table = acceptance_table(beta, probl.max_delta())
+        if rejection_free is not None and acc_rates and acc_rates[-1][1] < rejection_free:
+            c, best_c, accepted = rejection_free_step(probl, table, mcmc_steps, rng, c, best_x, best_c)
+            proposals = mcmc_steps
+            if budget is not None:
+                budget.spend(mcmc_steps)
+        else:
+            if profile is not None:
+                profile.tic()
+            moves = probl.propose_moves(mcmc_steps, rng)
+            uniforms = rng.random(mcmc_steps)
+            if profile is not None:
+                profile.toc("propose", mcmc_steps)
+            c, best_c, accepted, proposals = run_moves(probl, moves, uniforms, table, c, best_x, best_c,
+                                                       numba_backend, debug_delta_cost, profile, budget)
+        newly_solved = not solved and best_c == 0
+        solved = solved or newly_solved
+        acc_rate = accepted / proposals
         acc_rates.append((beta, acc_rate))
-        
-        print(f"acc.rate={accepted/mcmc_steps} beta={beta} c={c} [best={best_c}]")
+        if profile is not None:
+            profile.step_end(proposals, accepted)
+
+        if observer is not None:
+            observer.step_end(i, beta, acc_rate, c, best_c)
+            if best_c < prev_best_c:
+                observer.improved(i, best_c)
+            if newly_solved:
+                observer.solved(i)
+
+        if checkpoint is not None and ((checkpoint_every is not None and (i + 1) % checkpoint_every == 0) or
+                                       (checkpoint_seconds is not None and time.monotonic() - last_save >= checkpoint_seconds)):
+            save_checkpoint(checkpoint, probl, beta_list, i + 1, c, best_x, best_c, solved, acc_rates, rng)
+            last_save = time.monotonic()
+
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, probl, beta_list, len(acc_rates), c, best_x, best_c, solved, acc_rates, rng)
 
     ## Return the best instance
-    print(f"final cost = {best_c}")
+    if profile is not None:
+        profile.tic()
+    best = probl.copy()
+    if profile is not None:
+        profile.toc("copy")
+    best.set_config(best_x)
+    if observer is not None:
+        observer.end(best_c)
+    if profile is not None:
+        return best, acc_rates, profile
+    return best, acc_rates
+
+
+## Initial beta of the adaptive schedule, from the cost changes `deltas` of the moves of a pilot
+## run: the beta at which the Metropolis rule would accept a fraction target_acc of the moves that
+## increase the cost (the others are always accepted, and from a random configuration they are
+## already about half of the moves).
+def pilot_beta(deltas, target_acc):
+    deltas = np.asarray(deltas)
+    up = np.bincount(deltas[deltas > 0])
+    n = up.sum()
+    if n == 0:
+        return 0.0
+    d = np.arange(len(up))
+    acc = lambda beta: (up * np.exp(-beta * d)).sum() / n
+    lo, hi = 0.0, 1.0
+    while acc(hi) > target_acc:
+        lo, hi = hi, 2 * hi
+    ## bisection (the acceptance rate decreases with beta)
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if acc(mid) > target_acc:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+## Simulated annealing with an adaptive, acceptance-targeted schedule.
+## The run is made of annealing steps of mcmc_steps proposals each (at most max_steps of them),
+## as in simann, but the betas are chosen online:
+##  - the first step is a pilot random walk (beta = 0, every move accepted) that records the cost
+##    change of every move; the initial beta is the one that would accept a fraction target_acc of
+##    the cost increases among them (pilot_beta).
+##  - at each beta, steps are repeated until min_accepted moves have been accepted at that beta
+##    (the length of the chain N by default) or max_repeats steps have been run, so the number
+##    of steps per beta grows as the acceptance rate falls.
+##  - the cost is sampled `samples` times per step, and the next beta is beta + ln(1 + distance) / (3 sigma),
+##    sigma being the standard deviation of the cost samples at the current beta (Aarts and van
+##    Laarhoven): the increments are small where the cost fluctuates a lot, and large once it has
+##    flattened. They are capped at growth * beta, so that the low temperatures, where the solutions
+##    are found, are not skipped; with sigma = 0 the previous increment is kept.
+##  - the run stops when the chain is frozen: freeze_steps consecutive betas with no improvement
+##    of the best cost and either an acceptance rate below freeze_rate or a constant cost (or at
+##    the first solution with early stopping, or after max_steps steps).
+## Same return values as simann, the acceptance rates having one (beta, rate) entry per step
+## (the pilot included), so the number of proposals is len(acc_rates) * mcmc_steps (unless a
+## budget stopped the last step early; the pilot is charged to the budget at its end).
+def simann_adaptive(probl, mcmc_steps = 100, max_steps = 1000,
+                    target_acc = 0.2, min_accepted = None, max_repeats = 10,
+                    distance = 1.0, growth = 0.05, samples = 10, freeze_rate = 0.002, freeze_steps = 10,
+                    seed = None, debug_delta_cost = False, early_stopping = True,
+                    backend = "python", observer = None, budget = None):
+    rng = np.random.default_rng(seed)
+    numba_backend = NumbaKernel.use_numba(backend)
+    if min_accepted is None:
+        min_accepted = len(probl.x)
+
+    probl.init_config(rng)
+    c = probl.cost()
+    best_x = probl.x.copy()
+    best_c = c
+    solved = False
+    acc_rates = []
+
+    if observer is not None:
+        observer.start(np.full(max_steps, np.nan), 0, c)
+
+    ## Pilot: a random walk recording the cost changes of its moves
+    if observer is not None:
+        observer.step_start(0, 0.0)
+    deltas = []
+    for move in probl.propose_moves(mcmc_steps, rng):
+        delta_c = probl.compute_delta_cost(move)
+        deltas.append(delta_c)
+        probl.accept_move(move)
+        c += delta_c
+        if c <= best_c:
+            best_c = c
+            best_x[:] = probl.x
+    solved = best_c == 0
+    acc_rates.append((0.0, 1.0))
+    if budget is not None:
+        budget.spend(mcmc_steps)
+    if observer is not None:
+        observer.step_end(0, 0.0, 1.0, c, best_c)
+        if solved:
+            observer.solved(0)
+
+    beta = pilot_beta(deltas, target_acc)
+    dbeta = max(beta, 0.1)
+    frozen = 0
+    chunks = np.array_split(np.arange(mcmc_steps), samples)
+    stop = lambda: len(acc_rates) >= max_steps or (early_stopping and solved) or (budget is not None and budget.exhausted())
+    while not stop() and frozen < freeze_steps:
+        table = acceptance_table(beta, probl.max_delta())
+        beta_best_c = best_c
+        accepted_beta = 0
+        steps_beta = 0
+        costs = []
+        while steps_beta < max_repeats and not stop():
+            i = len(acc_rates)
+            if observer is not None:
+                observer.step_start(i, beta)
+            prev_best_c = best_c
+            moves = probl.propose_moves(mcmc_steps, rng)
+            uniforms = rng.random(mcmc_steps)
+            lazy = not isinstance(moves, np.ndarray)
+            accepted = proposals = 0
+            ## the same Metropolis step as simann, split into chunks to sample the cost
+            for chunk in chunks:
+                chunk_moves = itertools.islice(moves, len(chunk)) if lazy else moves[chunk]
+                c, best_c, a, n = run_moves(probl, chunk_moves, uniforms[chunk], table, c, best_x, best_c,
+                                            numba_backend, debug_delta_cost, budget=budget)
+                accepted += a
+                proposals += n
+                costs.append(c)
+                if budget is not None and budget.exhausted():
+                    break
+            accepted_beta += accepted
+            steps_beta += 1
+            newly_solved = not solved and best_c == 0
+            solved = solved or newly_solved
+            acc_rate = accepted / proposals
+            acc_rates.append((beta, acc_rate))
+            if observer is not None:
+                observer.step_end(i, beta, acc_rate, c, best_c)
+                if best_c < prev_best_c:
+                    observer.improved(i, best_c)
+                if newly_solved:
+                    observer.solved(i)
+            if accepted_beta >= min_accepted:
+                break
+
+        ## Freezing: no progress at this beta, and either a low acceptance rate or a cost that no
+        ## longer moves (the accepted moves only wander on a plateau)
+        sigma = np.std(costs)
+        if best_c == beta_best_c and (accepted_beta < freeze_rate * mcmc_steps * steps_beta or sigma == 0):
+            frozen += 1
+        else:
+            frozen = 0
+
+        if sigma > 0:
+            dbeta = np.log(1 + distance) / (3 * sigma)
+        beta += min(dbeta, growth * beta) if beta > 0 else dbeta
+
+    best = probl.copy()
+    best.set_config(best_x)
+    if observer is not None:
+        observer.end(best_c)
     return best, acc_rates
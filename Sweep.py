@@ -0,0 +1,266 @@
+import time
+from statistics import NormalDist
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import KSAT
+import SimAnn
+import BatchSimAnn
+
+"""
+Parallel executor for solving-probability sweeps over a grid of (N, M).
+
+Every (n, m, instance) task gets its own random streams, derived from a single root
+np.random.SeedSequence through the spawn key (n, m, instance): one for generating the
+instance and one for annealing it. Results are therefore reproducible whatever the
+number of workers and the order in which tasks are scheduled or completed.
+
+Every task reports the best cost of its instance, the number of proposed flips and the wall time.
+With a ResultsStore, each result is recorded as soon as it arrives, and the tasks already recorded
+by an earlier (possibly interrupted) run of the same sweep are skipped.
+
+With a tolerance, the instances of each grid point are counted in index order and the point stops
+as soon as the Wilson interval of its solving probability is narrow enough: the remaining instances
+are not launched, or are cancelled if still queued. Since the stopping point depends only on the
+results of the first instances, it is also the same for any number of workers.
+"""
+
+
+def task_seeds(entropy, *key):
+
+    """Independent (instance, annealing) seeds of the task identified by `key`"""
+
+    ksat_seed, simann_seed = np.random.SeedSequence(entropy, spawn_key=key).generate_state(2)
+    return int(ksat_seed), int(simann_seed)
+
+
+def make_instance(n, m, K, seed, cache=None):
+
+    """The instance KSAT(n, m, K, seed), loaded from the InstanceCache `cache` if given"""
+
+    if cache is None:
+        return KSAT.KSAT(n, m, K, seed=seed)
+    return cache.load(n, m, K, seed)
+
+
+def solve_instance(n, m, K, instance, entropy, params, cache=None):
+
+    """Generate and anneal one instance. Returns (n, m, instance, best cost, flips, wall time)"""
+
+    start = time.perf_counter()
+    ksat_seed, simann_seed = task_seeds(entropy, n, m, instance)
+    ksat = make_instance(n, m, K, ksat_seed, cache)
+    best, acc_rates = SimAnn.simann(ksat, seed=simann_seed, **params)
+    flips = len(acc_rates) * params.get("mcmc_steps", 100)
+    return n, m, instance, best.cost(), flips, time.perf_counter() - start
+
+
+def solve_batch(n, m, K, instances, entropy, params, cache=None):
+
+    """Generate the given instances of a grid point and anneal them together in one vectorized run.
+    Returns a list of (n, m, instance, best cost, flips, wall time), the wall time being shared
+    evenly among the instances"""
+
+    start = time.perf_counter()
+    problems = [make_instance(n, m, K, task_seeds(entropy, n, m, i)[0], cache) for i in instances]
+    # run_tasks only lets the fixed schedule through, which is the only one simann_batch runs
+    params = {key: value for key, value in params.items() if key not in ("schedule", "schedule_options")}
+    _, best_c, _, acc_rates = BatchSimAnn.simann_batch(problems, seed=task_seeds(entropy, n, m)[1], **params)
+    wall_time = (time.perf_counter() - start) / len(instances)
+    flips = params.get("mcmc_steps", 100) * params.get("n_replicas", 1)
+    return [(n, m, i, int(c), len(rates) * flips, wall_time)
+            for i, c, rates in zip(instances, best_c, acc_rates)]
+
+
+def run_tasks(todo, K:int, entropy, params:dict, workers=1, batch=False, cache=None, skip_if=None):
+
+    """Run the (n, m, instance) tasks of `todo`, on a pool of `workers` processes if workers > 1,
+    and yield the (n, m, instance, best cost, flips, wall time) results as they complete.
+    If batch is True, the instances of each (n, m) are annealed together with simann_batch.
+    If given, skip_if(n, m, instance) is checked before launching each task and, on a pool, for the
+    queued tasks after each result: the tasks for which it is True are not run (not with batch)."""
+
+    if batch:
+        groups = dict()
+        for n, m, i in todo:
+            groups.setdefault((n, m), []).append(i)
+        tasks = [(solve_batch, (n, m, K, instances, entropy, params, cache)) for (n, m), instances in groups.items()]
+    else:
+        tasks = [(solve_instance, (n, m, K, i, entropy, params, cache)) for n, m, i in todo]
+    if skip_if is not None and batch:
+        raise Exception("tasks cannot be skipped in batch mode")
+    if batch and params.get("schedule", "fixed") != "fixed":
+        raise Exception("simann_batch only runs the fixed schedule, use schedule='fixed' in batch mode")
+
+    if workers == 1:
+        for f, args in tasks:
+            if skip_if is not None and skip_if(*args[:2], args[3]):
+                continue
+            res = f(*args)
+            yield from (res if batch else [res])
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(f, *args): args for f, args in tasks}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                if not future.cancelled():
+                    res = future.result()
+                    yield from (res if batch else [res])
+            if skip_if is not None:
+                for future, args in list(pending.items()):
+                    if skip_if(*args[:2], args[3]) and future.cancel():
+                        del pending[future]
+
+
+def run_sweep(N:list, M:list, K:int, n_instances:int, params:dict, seed=None, workers=1, batch=False, cache=None,
+              skip=(), skip_if=None):
+
+    """Run every (n, m, instance) task of the grid (see run_tasks). `params` are the keyword
+    arguments passed to simann (or to simann_batch if batch is True).
+    If an InstanceCache is given, instances are loaded from it instead of being generated.
+    The (n, m, instance) tasks in `skip` are not run."""
+
+    entropy = np.random.SeedSequence(seed).entropy
+    # instance-major order, so that all the grid points progress together
+    todo = [(n, m, i) for i in range(n_instances) for n in N for m in M if (n, m, i) not in skip]
+    yield from run_tasks(todo, K, entropy, params, workers, batch, cache, skip_if)
+
+
+def wilson_interval(solved, runs, confidence=0.95):
+
+    """Wilson score interval of a probability estimated from `solved` successes out of `runs` trials"""
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = solved / runs
+    center = (p + z**2 / (2 * runs)) / (1 + z**2 / runs)
+    half = z / (1 + z**2 / runs) * np.sqrt(p * (1 - p) / runs + z**2 / (4 * runs**2))
+    return center - half, center + half
+
+
+def solving_probability(N:list, M:list, K:int, n_instances:int, params:dict, seed=None, workers=1, batch=False, cache=None,
+                        store=None, experiment="default", tolerance=None, confidence=0.95):
+
+    """Empirical probability of solving a random instance of K-SAT for every (n, m) of the grid,
+    as a dict P[(n, m)], and the number of instances used for each point, as a dict used[(n, m)].
+    If a ResultsStore is given, every run is recorded in it under the `experiment` label, and the
+    runs it already holds for the same sweep are reused instead of being run again.
+    If a tolerance is given (not with batch), each point stops after the first k instances once the
+    Wilson interval of P at the given confidence is at most 2 * tolerance wide; otherwise (and at
+    most) all n_instances are used. Only the instances that are used are recorded."""
+
+    if tolerance is not None and batch:
+        raise Exception("sequential stopping is not available in batch mode")
+    solved = {(n, m): 0 for n in N for m in M}
+    used = {(n, m): 0 for n in N for m in M}
+    stopped = set()
+    # results arrived before those of lower instance indices, waiting to be counted in order
+    waiting = {(n, m): dict() for n in N for m in M}
+
+    def count(n, m, instance, result, record):
+        point = (n, m)
+        waiting[point][instance] = result
+        while used[point] in waiting[point] and point not in stopped:
+            cost, flips, wall_time = waiting[point].pop(used[point])
+            if record and store is not None:
+                store.record(key, n, m, used[point], cost, flips, wall_time)
+            used[point] += 1
+            if cost == 0:
+                solved[point] += 1
+            if tolerance is not None:
+                lo, hi = wilson_interval(solved[point], used[point], confidence)
+                if hi - lo <= 2 * tolerance:
+                    stopped.add(point)
+
+    done = dict()
+    if store is not None:
+        key = store.key(experiment, K, seed, params, batch)
+        done = {task: cost for task, cost in store.done(key).items() if task[0] in N and task[1] in M and task[2] < n_instances}
+        for (n, m, instance), cost in sorted(done.items()):
+            count(n, m, instance, (cost, None, None), False)
+
+    skip_if = (lambda n, m, instance: (n, m) in stopped) if tolerance is not None else None
+    for n, m, instance, cost, flips, wall_time in run_sweep(N, M, K, n_instances, params, seed, workers, batch, cache,
+                                                            done, skip_if):
+        count(n, m, instance, (cost, flips, wall_time), True)
+
+    return {point: solved[point] / used[point] for point in solved}, used
+
+
+def threshold_posterior(alphas, solved, runs, alpha_grid, width_grid):
+
+    """Posterior of the threshold alpha_c on alpha_grid, given `solved` solved instances out of `runs`
+    at each ratio M/N of `alphas`, for the model P(alpha) = 1 / (1 + exp((alpha - alpha_c) / w)),
+    with a uniform prior on alpha_c and a log-uniform prior on the width w (marginalized over width_grid)"""
+
+    z = (alphas[:, None, None] - alpha_grid[None, :, None]) / width_grid[None, None, :]
+    # log-likelihood, with log P = -log(1 + e^z) and log(1 - P) = -log(1 + e^-z) computed without overflow
+    loglik = -(solved[:, None, None] * np.logaddexp(0, z) + (runs - solved)[:, None, None] * np.logaddexp(0, -z)).sum(axis=0)
+    post = np.exp(loglik - loglik.max()).sum(axis=1)
+    return post / post.sum()
+
+
+def posterior_quantiles(post, alpha_grid, q):
+
+    """Quantiles q of a posterior on alpha_grid"""
+
+    return alpha_grid[np.minimum(np.searchsorted(np.cumsum(post), q), len(alpha_grid) - 1)]
+
+
+def find_threshold(n:int, K:int, params:dict, alpha_range=(3.0, 5.0), width=0.05, confidence=0.95,
+                   round_size=10, max_instances=1000, seed=None, workers=1, batch=False, cache=None,
+                   store=None, experiment="threshold"):
+
+    """Adaptive estimate of the algorithmic threshold at n variables: the ratio alpha_c = M/N at which
+    the solving probability crosses 0.5, assumed to lie inside alpha_range.
+
+    Instead of a fixed grid of M, instances are placed where the threshold is most uncertain. After each
+    round, the posterior of alpha_c under a logistic model of P(M/N) (see threshold_posterior) is updated,
+    and the next round_size instances are spread over evenly spaced quantiles of that posterior, so they
+    concentrate around the crossing as it gets known. The search stops when the central credible interval
+    of alpha_c at the given confidence is narrower than `width`, or after max_instances instances.
+
+    Returns the estimate (posterior median), the credible interval (lo, hi), and the results as a dict
+    {m: (solved, runs)}. Instances, seeds, cache and store are handled as in solving_probability."""
+
+    entropy = np.random.SeedSequence(seed).entropy
+    done = dict()
+    if store is not None:
+        key = store.key(experiment, K, seed, params, batch)
+        done = store.done(key)
+
+    alpha_grid = np.linspace(alpha_range[0], alpha_range[1], 401)
+    width_grid = np.logspace(-3, 0, 40)
+    post = np.full(len(alpha_grid), 1 / len(alpha_grid))
+    results = dict()
+    used = 0
+    while True:
+        lo, estimate, hi = posterior_quantiles(post, alpha_grid, [(1 - confidence) / 2, 0.5, (1 + confidence) / 2])
+        if hi - lo <= width or used >= max_instances:
+            break
+
+        # the next round: the next instance of each M at the quantiles of the posterior
+        todo = []
+        for a in posterior_quantiles(post, alpha_grid, (np.arange(round_size) + 0.5) / round_size):
+            m = int(round(n * a))
+            todo.append((n, m, results.get(m, (0, 0))[1] + sum(task[1] == m for task in todo)))
+        costs = {task: done[task] for task in todo if task in done}
+        for _, m, i, cost, flips, wall_time in run_tasks([task for task in todo if task not in done],
+                                                          K, entropy, params, workers, batch, cache):
+            if store is not None:
+                store.record(key, n, m, i, cost, flips, wall_time)
+            costs[(n, m, i)] = cost
+        for (_, m, _), cost in costs.items():
+            solved, runs = results.get(m, (0, 0))
+            results[m] = (solved + (cost == 0), runs + 1)
+        used += len(todo)
+
+        M = np.array(sorted(results))
+        solved = np.array([results[m][0] for m in M])
+        runs = np.array([results[m][1] for m in M])
+        post = threshold_posterior(M / n, solved, runs, alpha_grid, width_grid)
+
+    return float(estimate), (float(lo), float(hi)), results
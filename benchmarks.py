@@ -0,0 +1,301 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from KSAT import KSAT
+from SimAnn import acceptance_table, metropolis_step, simann
+
+"""
+Benchmark suite of the K-SAT engine, over a grid of instance sizes (N, M/N, K).
+
+For every point of the grid it times instance generation, the cost (cached, recomputed from
+scratch and the np.prod variant), the delta cost (incremental and naive), copies, a full
+simann run and a late annealing step (at beta1, from an annealed configuration), with and without
+the break/make counters of KSAT(..., scores=True), and measures the peak memory of generation and of the simann run with tracemalloc.
+Every timing is repeated after some warmup runs, and the median and spread (min, max,
+interquartile range) over the repetitions are reported, per operation.
+
+Example usage:
+    python benchmarks.py --save baseline.json                 # run and save a baseline
+    python benchmarks.py --compare baseline.json              # run and flag regressions
+    python benchmarks.py --quick --only delta_cost simann     # smaller grid, some benchmarks
+
+In compare mode, a benchmark is flagged as a regression when its median is more than
+`threshold` (relative, 0.1 = 10%) above the baseline, and the exit status is 1 if any is.
+Timings are only comparable on the same machine.
+"""
+
+
+# grid of instances: every combination of N, M/N and K
+N_list = (200, 2000)
+alpha_list = (3.0, 4.2)
+K_list = (3, 5)
+
+# smaller grid of --quick
+quick_N_list = (200,)
+quick_alpha_list = (4.2,)
+quick_K_list = (3,)
+
+seed = 42
+repeats = 7
+warmup = 1
+threshold = 0.1
+
+# simann parameters of the full-run benchmark (early stopping off, so the work is fixed)
+simann_params = dict(anneal_steps=10, mcmc_steps=1000, beta0=0.1, beta1=10.0, early_stopping=False)
+
+
+def bench_generate(N, M, K):
+
+    """Instance generation"""
+
+    return 1, lambda: KSAT(N, M, K, seed=seed)
+
+
+def bench_cost(N, M, K):
+
+    """Cached cost (kept up to date by accept_move)"""
+
+    probl = KSAT(N, M, K, seed=seed)
+    n = 10000
+    def run():
+        for _ in range(n):
+            probl.cost()
+    return n, run
+
+
+def bench_full_cost(N, M, K):
+
+    """Cost recomputed from scratch (vectorized)"""
+
+    probl = KSAT(N, M, K, seed=seed)
+    return 10, lambda: [probl.full_cost() for _ in range(10)]
+
+
+def bench_cost_np_prod(N, M, K):
+
+    """Cost recomputed from scratch with np.prod"""
+
+    probl = KSAT(N, M, K, seed=seed)
+    return 10, lambda: [probl.cost_np_prod() for _ in range(10)]
+
+
+def bench_delta_cost(N, M, K):
+
+    """Incremental delta cost of random moves"""
+
+    probl = KSAT(N, M, K, seed=seed)
+    moves = np.random.default_rng(seed).integers(N, size=2000).tolist()
+    return len(moves), lambda: [probl.compute_delta_cost(move) for move in moves]
+
+
+def bench_delta_cost_naive(N, M, K):
+
+    """Naive delta cost of random moves (copy, flip and full cost)"""
+
+    probl = KSAT(N, M, K, seed=seed)
+    moves = np.random.default_rng(seed).integers(N, size=50).tolist()
+    return len(moves), lambda: [probl.naive_delta_cost(move) for move in moves]
+
+
+def bench_copy(N, M, K):
+
+    """Copy of an instance"""
+
+    probl = KSAT(N, M, K, seed=seed)
+    return 100, lambda: [probl.copy() for _ in range(100)]
+
+
+def bench_simann(N, M, K):
+
+    """Full simann run (per proposal)"""
+
+    probl = KSAT(N, M, K, seed=seed)
+    n = simann_params["anneal_steps"] * simann_params["mcmc_steps"]
+    return n, lambda: simann(probl, seed=seed, **simann_params)
+
+
+def bench_simann_scores(N, M, K):
+
+    """Full simann run with scores=True (per proposal)"""
+
+    probl = KSAT(N, M, K, seed=seed, scores=True)
+    n = simann_params["anneal_steps"] * simann_params["mcmc_steps"]
+    return n, lambda: simann(probl, seed=seed, **simann_params)
+
+
+def late_step(N, M, K, scores):
+
+    """Metropolis step of 10 * mcmc_steps proposals at beta1, always from the configuration
+    annealed by a simann run with simann_params"""
+
+    annealed, _ = simann(KSAT(N, M, K, seed=seed, scores=scores), seed=seed, **simann_params)
+    rng = np.random.default_rng(seed)
+    n = 10 * simann_params["mcmc_steps"]
+    moves, uniforms = rng.integers(N, size=n), rng.random(n)
+    table = acceptance_table(simann_params["beta1"], annealed.max_delta())
+
+    def run():
+        probl = annealed.copy()
+        metropolis_step(probl, moves, uniforms, table, probl.cost(), probl.x.copy(), probl.cost())
+
+    return n, run
+
+
+def bench_late_step(N, M, K):
+
+    """Late annealing step (per proposal)"""
+
+    return late_step(N, M, K, scores=False)
+
+
+def bench_late_step_scores(N, M, K):
+
+    """Late annealing step with scores=True (per proposal)"""
+
+    return late_step(N, M, K, scores=True)
+
+
+BENCHMARKS = {
+    "generate": bench_generate,
+    "cost": bench_cost,
+    "full_cost": bench_full_cost,
+    "cost_np_prod": bench_cost_np_prod,
+    "delta_cost": bench_delta_cost,
+    "delta_cost_naive": bench_delta_cost_naive,
+    "copy": bench_copy,
+    "simann": bench_simann,
+    "simann_scores": bench_simann_scores,
+    "late_step": bench_late_step,
+    "late_step_scores": bench_late_step_scores,
+}
+
+
+def time_benchmark(bench, N, M, K, repeats, warmup):
+
+    """Time a benchmark: warmup runs, then `repeats` timed runs. Returns the statistics of the
+    time per operation, in seconds"""
+
+    ops, run = bench(N, M, K)
+    for _ in range(warmup):
+        run()
+    times = np.zeros(repeats)
+    for r in range(repeats):
+        start = time.perf_counter()
+        run()
+        times[r] = (time.perf_counter() - start) / ops
+    q25, q75 = np.percentile(times, [25, 75])
+    return dict(unit="s/op", ops=ops, median=float(np.median(times)), min=float(times.min()),
+                max=float(times.max()), iqr=float(q75 - q25))
+
+
+def peak_memory(N, M, K):
+
+    """Peak memory (bytes, as traced by tracemalloc) of generating an instance and of a simann run on it"""
+
+    tracemalloc.start()
+    probl = KSAT(N, M, K, seed=seed)
+    _, generate_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    simann(probl, seed=seed, **simann_params)
+    _, simann_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"memory_generate": generate_peak, "memory_simann": simann_peak}
+
+
+def run_suite(N_list, alpha_list, K_list, names, repeats, warmup):
+
+    """Run the selected benchmarks over the grid. Returns {benchmark/N=..,M=..,K=..: statistics}"""
+
+    results = dict()
+    for N in N_list:
+        for alpha in alpha_list:
+            for K in K_list:
+                M = int(round(alpha * N))
+                case = f"N={N},M={M},K={K}"
+                for name in names:
+                    if name == "memory":
+                        for key, peak in peak_memory(N, M, K).items():
+                            results[f"{key}/{case}"] = dict(unit="bytes", median=peak, min=peak, max=peak, iqr=0)
+                    else:
+                        results[f"{name}/{case}"] = time_benchmark(BENCHMARKS[name], N, M, K, repeats, warmup)
+                    print(format_result(f"{name}/{case}", results, names), flush=True)
+    return results
+
+
+def format_result(key, results, names):
+
+    """One line of report for the benchmark `key` (all the memory metrics of its case for 'memory')"""
+
+    if key.startswith("memory/"):
+        case = key.split("/", 1)[1]
+        return "  ".join(f"{k:<42} {results[k]['median'] / 2**20:10.2f} MiB"
+                         for k in (f"memory_generate/{case}", f"memory_simann/{case}"))
+    r = results[key]
+    return f"{key:<42} {r['median'] * 1e6:12.3f} us/op  (min {r['min'] * 1e6:.3f}, max {r['max'] * 1e6:.3f}, iqr {r['iqr'] * 1e6:.3f})"
+
+
+def compare(results, baseline, threshold):
+
+    """Compare the medians with those of a baseline. Returns the list of regressions
+    (key, baseline median, current median, ratio) above the threshold"""
+
+    regressions = []
+    print(f"\n{'benchmark':<42} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for key in sorted(set(results) & set(baseline)):
+        old, new = baseline[key]["median"], results[key]["median"]
+        ratio = new / old if old else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append((key, old, new, ratio))
+            flag = "  REGRESSION"
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        print(f"{key:<42} {old:12.4g} {new:12.4g} {ratio:7.2f}{flag}")
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f"\n{len(missing)} benchmarks of the baseline were not run")
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the K-SAT engine")
+    parser.add_argument("--quick", action="store_true", help="run on a smaller grid")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS) + ["memory"], default=None,
+                        help="benchmarks to run (default: all)")
+    parser.add_argument("--repeats", type=int, default=repeats, help=f"timed repetitions (default: {repeats})")
+    parser.add_argument("--warmup", type=int, default=warmup, help=f"warmup runs (default: {warmup})")
+    parser.add_argument("--save", type=str, default=None, help="save the results as a JSON baseline")
+    parser.add_argument("--compare", type=str, default=None, help="compare with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=threshold,
+                        help=f"relative slowdown flagged as a regression (default: {threshold})")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    names = args.only if args.only is not None else list(BENCHMARKS) + ["memory"]
+    grid = (quick_N_list, quick_alpha_list, quick_K_list) if args.quick else (N_list, alpha_list, K_list)
+
+    results = run_suite(*grid, names, args.repeats, args.warmup)
+
+    if args.save is not None:
+        meta = dict(date=datetime.now(timezone.utc).isoformat(), python=sys.version.split()[0],
+                    numpy=np.__version__, platform=platform.platform(), machine=platform.machine(),
+                    repeats=args.repeats, warmup=args.warmup, simann_params=simann_params)
+        with open(args.save, "w") as f:
+            json.dump(dict(meta=meta, results=results), f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions above {args.threshold:.0%}")
+            sys.exit(1)
@@ -1,4 +1,4 @@
-import pandas as pd 
+from ResultsStore import ResultsStore
 from KSAT_functions import limiting_threshold_plot, find_intersection
 
 """
@@ -9,14 +9,17 @@ It is also possible to apply a rescaling of M to M/N, to see the curves
 collapsing on the same plot.
 """
 
-# load the csv file with the results
-data = pd.read_csv("psat.csv", index_col=None, sep=";")
+# load the results from the results store (the legacy results of psat.csv are imported the first time,
+# as the legacy-psat experiment); set experiment to the label of a 3SAT_properties.py sweep to use its runs
+experiment = "legacy-psat"
+store = ResultsStore("results.db")
+store.import_csv("psat.csv")
+data = store.probabilities(experiment=experiment)
 
-# very quick data cleaning to remove unwanted columns, and sorting for plotting purposes
-data = data.loc[:, ~data.columns.str.contains('^Unnamed')]
+# sorting for plotting purposes
 data.sort_values(by=["N", "M"], ascending=True, inplace=True)
 
-# extract all the results from the csv file
+# extract all the results from the results store
 mcmc_list = (1000, 2000, 3000, 4000, 5000)
 colors = ("dodgerblue", "gold", "green", "orange", "purple")
 
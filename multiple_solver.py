@@ -1,4 +1,5 @@
 from KSAT_functions import solve_multiple_M, plot_multiple_acc_rates
+from Observers import PrintObserver
 
 """
 Use this file to solve multiple instances of the K-SAT problem 
@@ -22,6 +23,7 @@ logspace = False        # if set to True, the betas in the annealing schedule ar
 early_stopping = False  # this stops the optimization as soon as a solution is found
 
 
-solutions, acc_rates_dict = solve_multiple_M(N, M, K, mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping)
+solutions, acc_rates_dict = solve_multiple_M(N, M, K, mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping,
+                                             PrintObserver())
 
 plot_multiple_acc_rates(acc_rates_dict)
\ No newline at end of file
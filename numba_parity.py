@@ -0,0 +1,35 @@
+import time
+
+import NumbaKernel
+from KSAT import KSAT
+from SimAnn import simann
+
+# check that the numba backend of simann follows exactly the same trajectory as the
+# Python one on fixed seeds, and compare their speed
+if not NumbaKernel.available:
+    raise SystemExit("numba is not installed")
+
+mismatches = 0
+for seed in range(5):
+    for scores in (False, True):
+        best1, acc_rates1 = simann(KSAT(200, 800, 3, seed=seed, scores=scores), anneal_steps=20, mcmc_steps=1000,
+                                   seed=seed, early_stopping=False)
+        best2, acc_rates2 = simann(KSAT(200, 800, 3, seed=seed, scores=scores), anneal_steps=20, mcmc_steps=1000,
+                                   seed=seed, early_stopping=False, backend="numba")
+        if acc_rates1 != acc_rates2 or best1.cost() != best2.cost() or (best1.x != best2.x).any():
+            mismatches += 1
+
+start1 = time.time()
+simann(KSAT(200, 800, 3, seed=42), anneal_steps=100, mcmc_steps=1000, seed=42, early_stopping=False)
+end1 = time.time()
+
+start2 = time.time()
+simann(KSAT(200, 800, 3, seed=42), anneal_steps=100, mcmc_steps=1000, seed=42, early_stopping=False, backend="numba")
+end2 = time.time()
+
+print(f"mismatches: {mismatches}")
+print(f"time python: {end1 - start1}")
+print(f"time numba: {end2 - start2}")
+
+if mismatches:
+    raise SystemExit(f"the numba backend differs from the Python one on {mismatches} runs")
@@ -1,4 +1,4 @@
-import pandas as pd 
+from ResultsStore import ResultsStore
 from KSAT_functions import plot_multiple_probabilities
 
 """
@@ -9,12 +9,14 @@ collapsing on the same plot.
 
 """
 
-# load the csv file with the results
-data = pd.read_csv("data.csv", index_col=None, sep=";")
+# load the results from the results store (the legacy results of data.csv are imported the first time,
+# as the legacy-data experiment); set experiment to the label of a 3SAT_properties.py sweep to use its runs
+experiment = "legacy-data"
+store = ResultsStore("results.db")
+store.import_csv("data.csv")
+data = store.probabilities(experiment=experiment, mcmc=1000, anneal=100)
 
-# very quick data cleaning to remove unwanted columns, and sorting for plotting purposes
-data = data.loc[:, ~data.columns.str.contains('^Unnamed')]
-data = data[(data["mcmc"] == 1000) & (data["anneal"] == 100)]
+# sorting for plotting purposes
 data.sort_values(by=["N", "M"], ascending=True, inplace=True)
 
 
@@ -25,7 +27,7 @@ P200 = (1.0, 1.0, 0.77, 0.47, 0.13, 0.0, 0.0)
 M200 = (650, 700, 750, 800, 850, 900, 950)
 
 
-# extract all the results from the csv file
+# extract all the results from the results store
 P300 = data[data["N"]==300]["P"]
 M300 = data[data["N"]==300]["M"]
 P400 = data[data["N"]==400]["P"]
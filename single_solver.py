@@ -1,4 +1,5 @@
 import KSAT
+from Observers import PrintObserver
 
 from KSAT_functions import solve, plot_acc_rates
 
@@ -24,6 +25,6 @@ early_stopping = False  # this stops the optimization as soon as a solution is f
 
 
 ksat = KSAT.KSAT(N, M, 3, seed)
-best, acc_rates = solve(ksat,mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping)
+best, acc_rates = solve(ksat,mcmc_steps, anneal_steps, beta0, beta1, seed, logspace, early_stopping, PrintObserver())
 
 plot_acc_rates(acc_rates)
\ No newline at end of file